@@ -0,0 +1,115 @@
+# ---- Fake Discord ----
+# Just enough of discord.py's guild/channel/interaction surface for the bot's delivery
+# path and slash-command callbacks to run offline.
+import random
+import asyncio
+import discord
+
+
+class FakeResponse:
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+class FakePermissions:
+    send_messages = True
+
+
+class FakeMember:
+    def __init__(self, member_id):
+        self.id = member_id
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.me = FakeMember(0)
+        self.members = {}
+        self.channels = []
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, stats, latency=0.05, rate_limit_rate=0.0):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.stats = stats
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def send(self, content, **kwargs):
+        started = asyncio.get_running_loop().time()
+        await asyncio.sleep(self.latency)
+        if random.random() < self.rate_limit_rate:
+            self.stats.rate_limited += 1
+            raise discord.HTTPException(FakeResponse(429, "Too Many Requests"), "You are being rate limited.")
+        if len(content) > 2000:
+            raise discord.HTTPException(FakeResponse(400, "Bad Request"), "Must be 2000 or fewer in length.")
+        self.stats.messages += 1
+        self.stats.bytes += len(content)
+        self.stats.send_latencies.append(asyncio.get_running_loop().time() - started)
+
+
+class DiscordStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.bytes = 0
+        self.rate_limited = 0
+        self.send_latencies = []
+
+
+def build_fake_guilds(user_ids, guild_count, channels_per_guild, stats, latency=0.05, rate_limit_rate=0.0):
+    """Spread users over guild_count guilds; returns (guilds, {channel_id: channel}, {user_id: channel_id})."""
+    guilds, channels, assignment = [], {}, {}
+    next_channel_id = 1_000_000
+    for g in range(guild_count):
+        guild = FakeGuild(10_000 + g)
+        for _ in range(channels_per_guild):
+            channel = FakeChannel(next_channel_id, guild, stats, latency, rate_limit_rate)
+            guild.channels.append(channel)
+            channels[channel.id] = channel
+            next_channel_id += 1
+        guilds.append(guild)
+    for i, user_id in enumerate(user_ids):
+        guild = guilds[i % guild_count]
+        guild.members[user_id] = FakeMember(user_id)
+        assignment[user_id] = random.choice(guild.channels).id
+    return guilds, channels, assignment
+
+
+class FakeInteractionResponse:
+    def __init__(self):
+        self.messages = []
+        self.deferred = False
+
+    async def send_message(self, content, **kwargs):
+        self.messages.append(content)
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content, **kwargs):
+        self.messages.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, user_id, guild):
+        self.user = FakeMember(user_id)
+        self.guild = guild
+        self.response = FakeInteractionResponse()
+        self.followup = FakeFollowup()
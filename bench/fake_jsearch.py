@@ -0,0 +1,78 @@
+# ---- Fake JSearch API ----
+# Local aiohttp stand-in for jsearch.p.rapidapi.com/search with configurable latency,
+# error rate and payload size. Point the bot at it with JSEARCH_URL.
+import random
+import asyncio
+from aiohttp import web
+from datetime import datetime, timedelta, UTC
+
+
+class FakeJSearch:
+    def __init__(self, latency=0.2, jitter=0.1, error_rate=0.0, jobs_per_page=10,
+                 description_size=2000, max_pages=5, vocabulary=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.jobs_per_page = jobs_per_page
+        self.description_size = description_size
+        self.max_pages = max_pages
+        # Words mixed into titles so broad feed queries have something to match locally
+        self.vocabulary = vocabulary
+        self.requests = 0
+        self.errors = 0
+        self._runner = None
+        self.url = None
+
+    def reset_counters(self):
+        self.requests = 0
+        self.errors = 0
+
+    async def handle_search(self, request):
+        self.requests += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            status = random.choice([429, 500, 503])
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            return web.json_response({"message": "fake error"}, status=status, headers=headers)
+        query = request.query.get("query", "")
+        page = int(request.query.get("page", 1))
+        if page > self.max_pages:
+            return web.json_response({"status": "OK", "data": []})
+        now = datetime.now(UTC)
+        jobs = []
+        for i in range(self.jobs_per_page):
+            # Later pages are older, like a real "newest first" feed
+            posted = now - timedelta(hours=page * 12 + i)
+            title = query.replace('+', ' ')
+            if self.vocabulary:
+                title = " ".join(random.sample(self.vocabulary, 3))
+            jobs.append({
+                "job_id": f"{query}-{request.query.get('country', 'us')}-{page}-{i}",
+                "job_title": f"{title} role {page}.{i}",
+                "employer_name": f"Employer {random.randint(1, 500)}",
+                "job_apply_link": f"https://example.com/jobs/{query}/{page}/{i}",
+                "job_posted_at_datetime_utc": posted.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "job_city": "Remote",
+                "job_country": request.query.get("country", "us").upper(),
+                "job_description": "x" * self.description_size,
+            })
+        return web.json_response({"status": "OK", "data": jobs}, headers={
+            "X-RateLimit-Requests-Limit": "1000000",
+            "X-RateLimit-Requests-Remaining": str(1000000 - self.requests),
+        })
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/search", self.handle_search)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/search"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,250 @@
+# ---- Offline Load Test ----
+# Drives the real delivery cycle and slash-command callbacks against a fake JSearch API,
+# fake Discord guilds/channels and a synthetic user_settings population.
+#
+#   BENCH_PG_DSN=postgresql://localhost/jobs_bench python -m bench.run --users 1000
+#
+# BENCH_PG_DSN must point at a scratch database: user_settings, seen_jobs, delivery_outbox and the job archive are truncated.
+import os
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+from datetime import datetime, timedelta, UTC
+
+import bot
+from bench.fake_jsearch import FakeJSearch
+from bench.fake_discord import DiscordStats, FakeInteraction, build_fake_guilds
+
+KEYWORD_POOL = ["intern", "software", "ai", "ml", "data", "backend", "frontend", "devops",
+                "security", "product", "design", "qa", "mobile", "cloud", "research", "analyst"]
+
+
+# ---- Query Counting ----
+class CountingConnection:
+    QUERY_METHODS = {"execute", "executemany", "fetch", "fetchrow", "fetchval", "copy_records_to_table"}
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in self.QUERY_METHODS:
+            return attr
+
+        async def counted(*args, **kwargs):
+            self._pool.queries += 1
+            return await attr(*args, **kwargs)
+        return counted
+
+
+class CountingPool:
+    """Wraps an asyncpg pool and counts acquires and queries issued through it."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.queries = 0
+        self.acquires = 0
+
+    def reset(self):
+        self.queries = 0
+        self.acquires = 0
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        self.acquires += 1
+        async with self._pool.acquire() as conn:
+            yield CountingConnection(conn, self)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+# ---- Synthetic Population ----
+async def populate(pool, user_ids, assignment, countries, keywords_per_user):
+    now = datetime.now(UTC)
+    rows = []
+    for user_id in user_ids:
+        keywords = random.sample(KEYWORD_POOL, keywords_per_user)
+        rows.append((user_id, keywords, random.choice(["", "remote", "london", "berlin"]) or None,
+                     random.choice(countries), assignment[user_id], True, True, now - timedelta(seconds=1)))
+    async with pool.acquire() as conn:
+        await conn.execute("TRUNCATE user_settings, seen_jobs, delivery_outbox, job_archive, archive_queries")
+        await conn.copy_records_to_table(
+            "user_settings", records=rows,
+            columns=["user_id", "keywords", "location", "country", "channel_id",
+                     "updates_enabled", "subscribed", "next_due"])
+
+
+async def make_all_due(pool):
+    async with pool.acquire() as conn:
+        await conn.execute("UPDATE user_settings SET next_due = now() - interval '1 second' "
+                           "WHERE updates_enabled AND subscribed")
+
+
+# ---- Benchmarks ----
+async def bench_cycles(args, fake_api, discord_stats, counting_pool):
+    delivery_latencies = []
+    original_deliver = bot.deliver_to_user
+
+    async def timed_deliver(*args):
+        started = time.monotonic()
+        try:
+            return await original_deliver(*args)
+        finally:
+            delivery_latencies.append(time.monotonic() - started)
+
+    bot.deliver_to_user = timed_deliver
+    results = []
+    try:
+        for cycle in range(args.cycles):
+            await make_all_due(bot.db_pool)
+            if args.cold_cache:
+                bot.job_cache = bot.JobResultCache(bot.JOB_CACHE_TTL, bot.JOB_CACHE_SIZE)
+            fake_api.reset_counters()
+            discord_stats.reset()
+            counting_pool.reset()
+            delivery_latencies.clear()
+            started = time.monotonic()
+            counts = await bot.run_due_deliveries(datetime.now(UTC), "bench") or {}
+            duration = time.monotonic() - started
+            results.append({
+                "cycle": cycle + 1,
+                "duration_s": duration,
+                "succeeded": counts.get("succeeded", 0),
+                "failed": counts.get("failed", 0),
+                "timed_out": counts.get("timed_out", 0),
+                "delivery_p50_ms": percentile(delivery_latencies, 50) * 1000,
+                "delivery_p99_ms": percentile(delivery_latencies, 99) * 1000,
+                "db_queries": counting_pool.queries,
+                "db_acquires": counting_pool.acquires,
+                "api_calls": fake_api.requests,
+                "api_errors": fake_api.errors,
+                "discord_messages": discord_stats.messages,
+                "discord_429s": discord_stats.rate_limited,
+            })
+    finally:
+        bot.deliver_to_user = original_deliver
+    return results
+
+
+async def bench_commands(args, user_ids, guilds, counting_pool):
+    commands = {
+        "ping": lambda i: bot.ping.callback(i),
+        "showkeywords": lambda i: bot.showkeywords.callback(i),
+        "showchannel": lambda i: bot.showchannel.callback(i),
+        "setlocation": lambda i: bot.setlocation.callback(i, location="Remote"),
+        "setkeywords": lambda i: bot.setkeywords.callback(i, keywords=", ".join(random.sample(KEYWORD_POOL, 2))),
+    }
+    results = {}
+    for name, invoke in commands.items():
+        latencies = []
+        counting_pool.reset()
+        for _ in range(args.command_calls):
+            user_id = random.choice(user_ids)
+            interaction = FakeInteraction(user_id, random.choice(guilds))
+            started = time.monotonic()
+            await invoke(interaction)
+            latencies.append(time.monotonic() - started)
+        results[name] = {
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "db_queries_per_call": counting_pool.queries / max(1, args.command_calls),
+        }
+    return results
+
+
+def print_report(cycle_results, command_results):
+    print("\n== Delivery cycles ==")
+    for r in cycle_results:
+        print(f"cycle {r['cycle']}: {r['duration_s']:.2f}s, "
+              f"{r['succeeded']} ok / {r['failed']} failed / {r['timed_out']} timed out, "
+              f"p50 {r['delivery_p50_ms']:.0f}ms p99 {r['delivery_p99_ms']:.0f}ms, "
+              f"{r['db_queries']} queries ({r['db_acquires']} acquires), "
+              f"{r['api_calls']} API calls ({r['api_errors']} errors), "
+              f"{r['discord_messages']} messages ({r['discord_429s']} 429s)")
+    print("\n== Slash commands ==")
+    for name, r in command_results.items():
+        print(f"/{name}: p50 {r['p50_ms']:.2f}ms p99 {r['p99_ms']:.2f}ms, "
+              f"{r['db_queries_per_call']:.2f} queries/call")
+
+
+async def main(args):
+    random.seed(args.seed)
+    fake_api = FakeJSearch(latency=args.api_latency, error_rate=args.api_error_rate,
+                           jobs_per_page=args.jobs_per_page, description_size=args.description_size,
+                           max_pages=args.api_pages,
+                           vocabulary=KEYWORD_POOL if args.feed_mode == "country" else None)
+    bot.JSEARCH_URL = await fake_api.start()
+    bot.RAPIDAPI_KEY = "bench"
+    bot.api_limiter = bot.RapidApiLimiter(args.api_rate, max(1, int(args.api_rate)), 10 ** 9)
+    bot.DISCORD_BATCH_LINGER = args.batch_linger
+    bot.JOB_FEED_MODE = args.feed_mode
+    bot.MAX_SUBSCRIBERS = 0
+    bot.PG_DSN = args.dsn
+
+    await bot.init_db()
+    counting_pool = CountingPool(bot.db_pool)
+
+    user_ids = list(range(1, args.users + 1))
+    discord_stats = DiscordStats()
+    guilds, channels, assignment = build_fake_guilds(
+        user_ids, args.guilds, args.channels_per_guild, discord_stats,
+        latency=args.discord_latency, rate_limit_rate=args.discord_429_rate)
+    await populate(bot.db_pool, user_ids, assignment, args.countries.split(","), args.keywords_per_user)
+
+    bot.db_pool = counting_pool
+    await bot.user_registry.load()
+    bot.client.channel_index = channels
+    bot.open_api_session()
+    try:
+        cycle_results = await bench_cycles(args, fake_api, discord_stats, counting_pool)
+        command_results = await bench_commands(args, user_ids, guilds, counting_pool)
+    finally:
+        await bot.close_api_session()
+        await counting_pool.close()
+        await fake_api.stop()
+    print_report(cycle_results, command_results)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the job delivery pipeline")
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_PG_DSN"),
+                        help="scratch Postgres DSN (default: $BENCH_PG_DSN); tables are truncated")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--channels-per-guild", type=int, default=3)
+    parser.add_argument("--keywords-per-user", type=int, default=2)
+    parser.add_argument("--countries", default="us,in,gb,ca")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--cold-cache", action="store_true", help="clear the JSearch result cache before each cycle")
+    parser.add_argument("--api-latency", type=float, default=0.2, help="mean fake JSearch latency (s)")
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-rate", type=float, default=1000.0, help="client-side JSearch requests/s")
+    parser.add_argument("--jobs-per-page", type=int, default=10)
+    parser.add_argument("--api-pages", type=int, default=5, help="pages the fake API has per query")
+    parser.add_argument("--feed-mode", choices=["query", "country"], default="query",
+                        help="per-user JSearch queries, or one broad feed per country matched locally")
+    parser.add_argument("--description-size", type=int, default=2000, help="bytes of description per job")
+    parser.add_argument("--discord-latency", type=float, default=0.05)
+    parser.add_argument("--discord-429-rate", type=float, default=0.0)
+    parser.add_argument("--batch-linger", type=float, default=0.2)
+    parser.add_argument("--command-calls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set BENCH_PG_DSN or pass --dsn (a scratch database; it gets truncated)")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -3,25 +3,39 @@ import functools
 def user_limit_check(func):
     @functools.wraps(func)
     async def wrapper(interaction, *args, **kwargs):
-        uid = interaction.user.id
-        async with db_pool.acquire() as conn:
-            row = await conn.fetchrow('SELECT subscribed FROM user_settings WHERE user_id=$1', uid)
-            user_count = await conn.fetchval('SELECT COUNT(*) FROM user_settings WHERE subscribed=TRUE')
-        if (not row or not row["subscribed"]) and user_count >= 18:
-            await interaction.response.send_message("❌ No more than 18 users can be subscribed at a time.", ephemeral=True)
-            return
-        return await func(interaction, *args, **kwargs)
+        started = time.monotonic()
+        try:
+            uid = interaction.user.id
+            row = user_registry.get(uid)
+            if (not row or not row["subscribed"]) and user_registry.is_full():
+                await interaction.response.send_message(f"❌ No more than {MAX_SUBSCRIBERS} users can be subscribed at a time.", ephemeral=True)
+                return
+            return await func(interaction, *args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            COMMAND_SECONDS.observe(elapsed, command=func.__name__)
+            log_event("command", command=func.__name__, user_id=interaction.user.id, seconds=round(elapsed, 4))
     return wrapper
 
 
 # ---- Imports ----
 import os
+import re
+import json
+import time
+import random
+import socket
+import hashlib
+import logging
+import contextlib
 import asyncpg
 import discord
 import aiohttp
 import asyncio
 from dotenv import load_dotenv
 from discord import app_commands
+from aiohttp import web
+from collections import OrderedDict
 from datetime import datetime, timedelta, UTC
 
 # ---- Load environment variables ----
@@ -30,7 +44,225 @@ load_dotenv("api.env")
 # ---- Globals ----
 PG_DSN = os.environ.get("PG_DSN")
 RAPIDAPI_KEY = os.environ.get("RAPIDAPI_KEY")
+JOB_CACHE_TTL = int(os.environ.get("JOB_CACHE_TTL", 60 * 30))  # seconds
+JOB_CACHE_SIZE = int(os.environ.get("JOB_CACHE_SIZE", 256))
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 20))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", 10))
+HTTP_KEEPALIVE = float(os.environ.get("HTTP_KEEPALIVE", 60))  # seconds
+HTTP_DNS_TTL = int(os.environ.get("HTTP_DNS_TTL", 300))  # seconds
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))  # seconds, whole request
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10))  # seconds
+DELIVERY_CONCURRENCY = int(os.environ.get("DELIVERY_CONCURRENCY", 8))
+DELIVERY_TIMEOUT = float(os.environ.get("DELIVERY_TIMEOUT", 60))  # seconds, per user
+DELIVERY_INTERVAL = timedelta(days=4)
+DELIVERY_RETRY_DELAY = timedelta(seconds=int(os.environ.get("DELIVERY_RETRY_DELAY", 60 * 10)))
+SCHEDULER_MAX_SLEEP = float(os.environ.get("SCHEDULER_MAX_SLEEP", 60 * 60))  # seconds
+RAPIDAPI_RATE_PER_SEC = float(os.environ.get("RAPIDAPI_RATE_PER_SEC", 1))
+RAPIDAPI_BURST = int(os.environ.get("RAPIDAPI_BURST", 1))
+RAPIDAPI_MONTHLY_QUOTA = int(os.environ.get("RAPIDAPI_MONTHLY_QUOTA", 200))
+# Start thinning out deliveries once less than this fraction of the monthly quota is left,
+# and stop entirely at the reserve so /searchnow keeps working
+RAPIDAPI_QUOTA_SLOWDOWN = float(os.environ.get("RAPIDAPI_QUOTA_SLOWDOWN", 0.2))
+RAPIDAPI_QUOTA_RESERVE = int(os.environ.get("RAPIDAPI_QUOTA_RESERVE", 10))
+QUOTA_DEFER_DELAY = timedelta(seconds=int(os.environ.get("QUOTA_DEFER_DELAY", 60 * 60 * 6)))
+API_MAX_RETRIES = int(os.environ.get("API_MAX_RETRIES", 3))
+API_BACKOFF_BASE = float(os.environ.get("API_BACKOFF_BASE", 1))  # seconds
+API_BACKOFF_CAP = float(os.environ.get("API_BACKOFF_CAP", 30))  # seconds
+JSEARCH_HOST = os.environ.get("JSEARCH_HOST", "jsearch.p.rapidapi.com")
+JSEARCH_URL = os.environ.get("JSEARCH_URL", f"https://{JSEARCH_HOST}/search")
+SEEN_JOBS_WINDOW = timedelta(days=int(os.environ.get("SEEN_JOBS_WINDOW_DAYS", 30)))
+SEEN_JOBS_PURGE_INTERVAL = float(os.environ.get("SEEN_JOBS_PURGE_INTERVAL", 60 * 60))  # seconds
+PURGE_INTERVAL = float(os.environ.get("PURGE_INTERVAL", 60 * 60))  # seconds, between expired-row purges
+JOB_MAX_PAGES = int(os.environ.get("JOB_MAX_PAGES", 3))
+# "query": one JSearch query per distinct set of user keywords; "country": one broad feed per
+# country, matched against every subscriber locally, so API calls don't grow with users
+JOB_FEED_MODE = os.environ.get("JOB_FEED_MODE", "query")
+FEED_QUERY = os.environ.get("FEED_QUERY", "jobs")
+# One refresh per delivery interval: each feed covers the jobs posted since the last one, and a
+# country costs FEED_MAX_PAGES * 30 / 4 = ~38 calls a month, so the default quota covers 5
+FEED_MAX_PAGES = int(os.environ.get("FEED_MAX_PAGES", 5))
+FEED_TTL = int(os.environ.get("FEED_TTL", DELIVERY_INTERVAL.total_seconds()))  # seconds
+# The cap only exists to protect the API quota in query mode; 0 means no cap
+MAX_SUBSCRIBERS = int(os.environ.get("MAX_SUBSCRIBERS", 18 if JOB_FEED_MODE == "query" else 0))
+ARCHIVE_STALE_AFTER = timedelta(seconds=int(os.environ.get("ARCHIVE_STALE_AFTER", 60 * 60)))
+ARCHIVE_RETENTION = timedelta(days=int(os.environ.get("ARCHIVE_RETENTION_DAYS", 30)))
+ARCHIVE_SEARCH_LIMIT = int(os.environ.get("ARCHIVE_SEARCH_LIMIT", 200))
+DISCORD_MESSAGE_LIMIT = 2000
+DISCORD_BATCH_LINGER = float(os.environ.get("DISCORD_BATCH_LINGER", 1.0))  # seconds
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))  # 0 disables the /metrics endpoint
+# "inline": the gateway process also runs deliveries; "workers": only worker.py processes do
+DELIVERY_MODE = os.environ.get("DELIVERY_MODE", "inline")
+DELIVERY_BATCH_SIZE = int(os.environ.get("DELIVERY_BATCH_SIZE", 200))
+DELIVERY_LEASE = timedelta(seconds=int(os.environ.get("DELIVERY_LEASE", 60 * 10)))
+SCHEDULE_CHANNEL = "job_schedule_changed"  # Postgres NOTIFY channel
+# Global command sync is slow and rate limited, so it's skipped when the command definitions
+# hash to what was last synced; set FORCE_COMMAND_SYNC=1 to sync anyway
+FORCE_COMMAND_SYNC = os.environ.get("FORCE_COMMAND_SYNC", "0") == "1"
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))  # then the message is dead-lettered
+OUTBOX_RETRY_BASE = float(os.environ.get("OUTBOX_RETRY_BASE", 60))  # seconds
+OUTBOX_RETRY_CAP = float(os.environ.get("OUTBOX_RETRY_CAP", 60 * 60 * 6))  # seconds
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 200))
+OUTBOX_RETENTION = timedelta(days=int(os.environ.get("OUTBOX_RETENTION_DAYS", 30)))  # sent/dead rows
 db_pool = None
+# One pooled HTTP client for outbound API traffic; opened by whichever process runs setup
+api_session = None
+# Set whenever a command changes someone's delivery schedule so the scheduler re-plans early
+schedule_changed = asyncio.Event()
+
+# ---- Metrics ----
+# Minimal Prometheus-format metrics, served on METRICS_HOST:METRICS_PORT/metrics.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Metric:
+    def __init__(self, kind, name, help_text, labelnames=()):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}  # label values tuple -> value
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_str(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Counter(Metric):
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__("counter", name, help_text, labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{self._label_str(key)} {value}" for key, value in self._values.items()]
+
+class Gauge(Counter):
+    def __init__(self, name, help_text, labelnames=()):
+        Metric.__init__(self, "gauge", name, help_text, labelnames)
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__("histogram", name, help_text, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts, total, n = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._values[key] = (counts, total + value, n + 1)
+
+    def render(self):
+        lines = []
+        for key, (counts, total, n) in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._label_str(key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{self._label_str(key, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {n}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+JSEARCH_REQUEST_SECONDS = metrics.register(Histogram(
+    "jsearch_request_seconds", "JSearch request latency", ("status",)))
+DB_ACQUIRE_SECONDS = metrics.register(Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for an asyncpg pool connection"))
+DB_QUERY_SECONDS = metrics.register(Histogram(
+    "db_query_seconds", "asyncpg query execution time", ("statement",)))
+DELIVERY_CYCLE_SECONDS = metrics.register(Histogram(
+    "delivery_cycle_seconds", "Duration of a scheduled delivery cycle"))
+DELIVERY_DUE_USERS = metrics.register(Gauge(
+    "delivery_due_users", "Users due for delivery at the start of the last cycle"))
+DELIVERIES_TOTAL = metrics.register(Counter(
+    "deliveries_total", "Scheduled deliveries by outcome", ("outcome",)))
+DISCORD_SEND_SECONDS = metrics.register(Histogram(
+    "discord_send_seconds", "Discord channel.send latency"))
+DISCORD_RATE_LIMITED_TOTAL = metrics.register(Counter(
+    "discord_rate_limited_total", "Discord 429 responses, including ones discord.py retried"))
+COMMAND_SECONDS = metrics.register(Histogram(
+    "command_seconds", "Slash-command handler latency", ("command",)))
+OUTBOX_SENDS_TOTAL = metrics.register(Counter(
+    "outbox_sends_total", "Outbox send attempts by result (sent, retry, dead)", ("result",)))
+ARCHIVE_LOOKUPS_TOTAL = metrics.register(Counter(
+    "archive_lookups_total", "Job archive lookups by result (fresh, stale, miss)", ("result",)))
+
+def log_event(event, **fields):
+    """Structured log line: one JSON object per event."""
+    print(json.dumps({"ts": datetime.now(UTC).isoformat(), "event": event, **fields}, default=str))
+
+class _DiscordRateLimitFilter(logging.Filter):
+    # discord.py logs every 429 it gets, whether it then retries or raises, so this is the one
+    # place they're counted
+    def filter(self, record):
+        if str(record.msg).startswith("We are being rate limited"):
+            DISCORD_RATE_LIMITED_TOTAL.inc()
+        return True
+
+logging.getLogger("discord.http").addFilter(_DiscordRateLimitFilter())
+
+async def start_metrics_server():
+    if not METRICS_PORT:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    print(f"[INFO] Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+class InstrumentedPool:
+    """asyncpg pool wrapper that records how long callers wait for a connection."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        started = time.monotonic()
+        async with self._pool.acquire() as conn:
+            DB_ACQUIRE_SECONDS.observe(time.monotonic() - started)
+            yield conn
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+def _record_query(query):
+    statement = query.query.lstrip().split(None, 1)[0].upper() if query.query.strip() else "UNKNOWN"
+    DB_QUERY_SECONDS.observe(query.elapsed, statement=statement)
+
+async def _init_connection(conn):
+    conn.add_query_logger(_record_query)
 
 # ---- Discord Client ----
 
@@ -48,34 +280,395 @@ class MyClient(discord.Client):
     def __init__(self):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
+        self.metrics_runner = None
+        self.schedule_listener = None
+        self.scheduler_task = None
+        # channel_id -> channel, kept current from gateway events
+        self.channel_index = {}
 
     async def setup_hook(self):
-        await init_db()
+        started = time.monotonic()
+        open_api_session()
+        # Independent steps run concurrently; everything after init_db needs the migrated schema
+        self.metrics_runner, _ = await asyncio.gather(start_metrics_server(), init_db())
+        steps = [user_registry.load(), self.sync_commands()]
+        if DELIVERY_MODE == "inline":
+            steps.append(listen_for_schedule_changes())
+        results = await asyncio.gather(*steps)
+        if DELIVERY_MODE == "inline":
+            self.schedule_listener = results[-1]
+            # Started exactly once here, not from on_ready, which runs again on every reconnect
+            self.scheduler_task = asyncio.create_task(job_update_task())
+        print(f"[INFO] Setup finished in {time.monotonic() - started:.2f}s")
+        log_event("setup", seconds=round(time.monotonic() - started, 3), commands_synced=results[2])
+
+    async def sync_commands(self):
+        """Sync the command tree only if its definitions changed since the last sync.
+
+        The hash of the serialized commands is kept in bot_state. Returns whether it synced.
+        """
+        definitions = sorted((command.to_dict(self.tree) for command in self.tree.get_commands()),
+                             key=lambda command: command["name"])
+        digest = hashlib.sha256(json.dumps([self.application_id, definitions], sort_keys=True,
+                                           default=str).encode()).hexdigest()
+        async with db_pool.acquire() as conn:
+            synced = await conn.fetchval("SELECT value FROM bot_state WHERE key = 'command_tree_hash'")
+        if synced == digest and not FORCE_COMMAND_SYNC:
+            print("[INFO] Slash commands unchanged; skipping sync")
+            return False
         await self.tree.sync()
+        async with db_pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO bot_state (key, value) VALUES ('command_tree_hash', $1)
+                ON CONFLICT (key) DO UPDATE SET value = $1, updated_at = now()
+            ''', digest)
+        print(f"[INFO] Synced {len(definitions)} slash commands")
+        return True
+
+    async def close(self):
+        if self.scheduler_task is not None:
+            self.scheduler_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.scheduler_task
+        await close_api_session()
+        if self.schedule_listener is not None:
+            await self.schedule_listener.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await super().close()
+
+    def resolve_channel(self, channel_id):
+        return self.channel_index.get(channel_id) if channel_id else None
+
+    def _index_guild(self, guild):
+        for ch in guild.channels:
+            self.channel_index[ch.id] = ch
+
+    async def on_guild_join(self, guild):
+        self._index_guild(guild)
+
+    async def on_guild_remove(self, guild):
+        for ch in guild.channels:
+            self.channel_index.pop(ch.id, None)
+
+    async def on_guild_channel_create(self, channel):
+        self.channel_index[channel.id] = channel
+
+    async def on_guild_channel_delete(self, channel):
+        self.channel_index.pop(channel.id, None)
 
     async def on_ready(self):
         print(f"✅ Logged in as {self.user} (ID: {self.user.id})")
-        # Start the background job task
-        self.loop.create_task(job_update_task())
+        # Rebuild the channel index from the fresh guild cache
+        self.channel_index = {}
+        for g in self.guilds:
+            self._index_guild(g)
+
+def open_api_session():
+    """Create the pooled HTTP client all outbound API traffic goes through."""
+    global api_session
+    api_session = create_api_session()
+    return api_session
+
+async def close_api_session():
+    global api_session
+    if api_session is not None:
+        await api_session.close()
+        api_session = None
+
+def create_api_session():
+    """One pooled HTTP client for all outbound API traffic, reused across deliveries."""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE,
+        ttl_dns_cache=HTTP_DNS_TTL,
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
 
 async def init_db():
     global db_pool
-    db_pool = await asyncpg.create_pool(PG_DSN)
+    db_pool = InstrumentedPool(await asyncpg.create_pool(PG_DSN, init=_init_connection))
     async with db_pool.acquire() as conn:
+        await run_migrations(conn)
+
+# ---- Schema Migrations ----
+# Applied in order at startup and recorded in schema_migrations. Never edit a migration that
+# has shipped; add a new one instead. Non-transactional migrations must be safe to re-run.
+MIGRATION_LOCK_ID = 0x6a6f6273  # pg advisory lock key, serializes concurrent startups
+MIGRATION_LOCK_POLL = 0.5  # seconds between attempts to take the migration lock
+BACKFILL_BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", 500))
+
+async def _migrate_base_schema(conn):
+    # Everything the bot created before migrations existed; IF NOT EXISTS adopts older databases
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id BIGINT PRIMARY KEY,
+            keywords TEXT,
+            location TEXT,
+            country TEXT,
+            days INT,
+            s_id BIGINT,
+            updates_enabled BOOLEAN DEFAULT FALSE,
+            last_sent TEXT,
+            channel_id BIGINT,
+            subscribed BOOLEAN DEFAULT TRUE
+        )
+    ''')
+    # Next delivery time; NULL while updates are off
+    await conn.execute('ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS next_due TIMESTAMPTZ')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS user_settings_next_due_idx
+        ON user_settings (next_due) WHERE updates_enabled AND subscribed
+    ''')
+    # Backfill from the legacy last_sent text; unparseable values are due immediately
+    await conn.execute('''
+        UPDATE user_settings
+        SET next_due = CASE
+            WHEN last_sent ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN last_sent::timestamptz + interval '4 days'
+            ELSE now()
+        END
+        WHERE next_due IS NULL AND updates_enabled AND subscribed
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS seen_jobs (
+            user_id BIGINT,
+            job_id TEXT,
+            seen_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (user_id, job_id)
+        )
+    ''')
+    await conn.execute('CREATE INDEX IF NOT EXISTS seen_jobs_seen_at_idx ON seen_jobs (seen_at)')
+
+# Shared by the batched backfill and the final catch-up before the column swap
+_TYPED_COLUMNS_BACKFILL = '''
+    last_sent_ts = CASE
+        WHEN last_sent ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN last_sent::timestamptz
+    END,
+    keyword_list = CASE
+        WHEN keywords IS NOT NULL THEN array(
+            SELECT btrim(k) FROM unnest(string_to_array(keywords, ',')) AS k WHERE btrim(k) <> ''
+        )
+    END
+'''
+
+async def _migrate_add_typed_columns(conn):
+    await conn.execute('''
+        ALTER TABLE user_settings
+            ADD COLUMN IF NOT EXISTS last_sent_ts TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS keyword_list TEXT[]
+    ''')
+    # Backfill in small keyset-paginated batches, each its own short transaction,
+    # so row locks are held briefly and the table stays writable throughout
+    last_id = -1
+    while True:
+        ids = await conn.fetch(
+            'SELECT user_id FROM user_settings WHERE user_id > $1 ORDER BY user_id LIMIT $2',
+            last_id, BACKFILL_BATCH_SIZE)
+        if not ids:
+            break
+        last_id = ids[-1]["user_id"]
+        await conn.execute(f'UPDATE user_settings SET {_TYPED_COLUMNS_BACKFILL} WHERE user_id = ANY($1::bigint[])',
+                           [row["user_id"] for row in ids])
+        await asyncio.sleep(0)
+
+async def _migrate_swap_typed_columns(conn):
+    # Catch rows written since the backfill, then swap the typed columns in (metadata-only)
+    await conn.execute(f'''
+        UPDATE user_settings SET {_TYPED_COLUMNS_BACKFILL}
+        WHERE (last_sent IS NOT NULL AND last_sent_ts IS NULL)
+           OR (keywords IS NOT NULL AND keyword_list IS NULL)
+    ''')
+    await conn.execute('ALTER TABLE user_settings DROP COLUMN last_sent')
+    await conn.execute('ALTER TABLE user_settings RENAME COLUMN last_sent_ts TO last_sent')
+    await conn.execute('ALTER TABLE user_settings DROP COLUMN keywords')
+    await conn.execute('ALTER TABLE user_settings RENAME COLUMN keyword_list TO keywords')
+
+async def _build_index_concurrently(conn, name, definition):
+    """CREATE INDEX CONCURRENTLY name ON definition, replacing an INVALID leftover.
+
+    A failed concurrent build leaves an invalid index behind that IF NOT EXISTS would skip.
+    """
+    valid = await conn.fetchval('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)', name)
+    if valid:
+        return
+    if valid is not None:
+        print(f"[INFO] Rebuilding invalid index {name}")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    await conn.execute(f'CREATE INDEX CONCURRENTLY {name} ON {definition}')
+
+PARTIAL_INDEXES = [
+    ("user_settings_due_idx",
+     "user_settings (next_due) WHERE updates_enabled AND subscribed AND keywords IS NOT NULL"),
+    ("user_settings_subscribed_idx", "user_settings (user_id) WHERE subscribed"),
+]
+
+async def _migrate_partial_indexes(conn):
+    # CONCURRENTLY so building them doesn't block writes; can't run inside a transaction
+    for name, definition in PARTIAL_INDEXES:
+        await _build_index_concurrently(conn, name, definition)
+    await conn.execute('DROP INDEX CONCURRENTLY IF EXISTS user_settings_next_due_idx')
+
+async def _migrate_delivery_leases(conn):
+    # Which delivery process currently owns a user, and until when
+    await conn.execute('''
+        ALTER TABLE user_settings
+            ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+            ADD COLUMN IF NOT EXISTS lease_expires TIMESTAMPTZ
+    ''')
+
+async def _migrate_delivery_outbox(conn):
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS delivery_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            user_id BIGINT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            content TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',  -- pending, sent or dead
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt TIMESTAMPTZ NOT NULL DEFAULT now(),
+            last_error TEXT,
+            lease_owner TEXT,
+            lease_expires TIMESTAMPTZ,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            sent_at TIMESTAMPTZ
+        )
+    ''')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS delivery_outbox_pending_idx
+        ON delivery_outbox (next_attempt) WHERE status = 'pending'
+    ''')
+
+async def _migrate_job_archive(conn):
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_archive (
+            job_id TEXT PRIMARY KEY,
+            country TEXT NOT NULL,
+            title TEXT,
+            employer TEXT,
+            apply_link TEXT,
+            city TEXT,
+            state TEXT,
+            is_remote BOOLEAN NOT NULL DEFAULT FALSE,
+            description TEXT,
+            posted_at TIMESTAMPTZ,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            search TSVECTOR GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(employer, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'C')
+            ) STORED
+        )
+    ''')
+    await conn.execute('CREATE INDEX IF NOT EXISTS job_archive_search_idx ON job_archive USING GIN (search)')
+    await conn.execute('CREATE INDEX IF NOT EXISTS job_archive_country_posted_idx ON job_archive (country, posted_at)')
+    await conn.execute('CREATE INDEX IF NOT EXISTS job_archive_fetched_at_idx ON job_archive (fetched_at)')
+    # When each normalized query was last fetched from JSearch, which jobs came back (newest
+    # first), and whether paging ran to the last page
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_queries (
+            query_key TEXT PRIMARY KEY,
+            refreshed_at TIMESTAMPTZ NOT NULL,
+            job_ids TEXT[] NOT NULL,
+            complete BOOLEAN NOT NULL
+        )
+    ''')
+
+async def _migrate_bot_state(conn):
+    # Small key/value facts that must survive restarts, e.g. the last synced command hash
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    ''')
+
+# (version, name, migrate, transactional)
+MIGRATIONS = [
+    (1, "base schema", _migrate_base_schema, True),
+    (2, "add typed last_sent/keywords columns", _migrate_add_typed_columns, False),
+    (3, "swap in typed last_sent/keywords columns", _migrate_swap_typed_columns, True),
+    (4, "partial indexes for due users and subscriber count", _migrate_partial_indexes, False),
+    (5, "delivery leases", _migrate_delivery_leases, True),
+    (6, "delivery outbox", _migrate_delivery_outbox, True),
+    (7, "job archive", _migrate_job_archive, True),
+    (8, "bot state", _migrate_bot_state, True),
+]
+
+async def run_migrations(conn):
+    # Poll rather than block in pg_advisory_lock: a session waiting inside that statement holds
+    # a snapshot, and the CONCURRENTLY index builds of whoever has the lock wait for it to end
+    while not await conn.fetchval('SELECT pg_try_advisory_lock($1)', MIGRATION_LOCK_ID):
+        await asyncio.sleep(MIGRATION_LOCK_POLL)
+    try:
+        # Under the lock too: concurrent CREATE TABLE IF NOT EXISTS can still collide
         await conn.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id BIGINT PRIMARY KEY,
-                keywords TEXT,
-                location TEXT,
-                country TEXT,
-                days INT,
-                s_id BIGINT,
-                updates_enabled BOOLEAN DEFAULT FALSE,
-                last_sent TEXT,
-                channel_id BIGINT,
-                subscribed BOOLEAN DEFAULT TRUE
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
             )
         ''')
+        applied = {row["version"] for row in await conn.fetch('SELECT version FROM schema_migrations')}
+        for version, name, migrate, transactional in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"[INFO] Applying migration {version}: {name}")
+            if transactional:
+                async with conn.transaction():
+                    await migrate(conn)
+                    await conn.execute('INSERT INTO schema_migrations (version, name) VALUES ($1, $2)', version, name)
+            else:
+                await migrate(conn)
+                await conn.execute('INSERT INTO schema_migrations (version, name) VALUES ($1, $2)', version, name)
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
+
+# ---- User Settings Registry ----
+class UserRegistry:
+    """Write-through in-memory copy of user_settings plus the subscribed count.
+
+    Loaded once at startup; command handlers update it right after their DB write succeeds,
+    so reads (limit checks, show* commands) never need a database round trip.
+    """
+
+    FIELDS = ("keywords", "location", "country", "channel_id", "updates_enabled", "subscribed")
+
+    def __init__(self):
+        self._users = {}
+        self.subscribed_count = 0
+
+    async def load(self):
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch(f'SELECT user_id, {", ".join(self.FIELDS)} FROM user_settings')
+        self._users = {row["user_id"]: {f: row[f] for f in self.FIELDS} for row in rows}
+        self.subscribed_count = sum(1 for u in self._users.values() if u["subscribed"])
+        print(f"[INFO] Loaded {len(self._users)} users ({self.subscribed_count} subscribed)")
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def is_full(self):
+        return bool(MAX_SUBSCRIBERS) and self.subscribed_count >= MAX_SUBSCRIBERS
+
+    def update(self, user_id, **fields):
+        user = self._users.get(user_id)
+        if user is None:
+            # Mirror the column defaults a fresh INSERT gets
+            user = dict.fromkeys(self.FIELDS)
+            user["updates_enabled"] = False
+            user["subscribed"] = True
+            self._users[user_id] = user
+            self.subscribed_count += 1
+        was_subscribed = user["subscribed"]
+        user.update(fields)
+        if user["subscribed"] != was_subscribed:
+            self.subscribed_count += 1 if user["subscribed"] else -1
+
+user_registry = UserRegistry()
 client = MyClient()
 # ---- Supported Countries ----
 COUNTRY_CHOICES = {
@@ -151,6 +744,7 @@ async def setcountry(interaction: discord.Interaction, country: str):
             VALUES ($1, $2)
             ON CONFLICT (user_id) DO UPDATE SET country = $2
         ''', uid, country)
+    user_registry.update(uid, country=country)
     await interaction.response.send_message(f"🌍 Country set to: **{COUNTRY_CHOICES[country]}** ({country})", ephemeral=True)
 
 # ---- Slash Command: showcountry ----
@@ -158,8 +752,7 @@ async def setcountry(interaction: discord.Interaction, country: str):
 @user_limit_check
 async def showcountry(interaction: discord.Interaction):
     uid = interaction.user.id
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT country FROM user_settings WHERE user_id=$1', uid)
+    row = user_registry.get(uid)
     if not row or not row["country"]:
         await interaction.response.send_message("You haven't set a country yet. Use /setcountry to pick one.", ephemeral=True)
         return
@@ -174,7 +767,10 @@ async def showcountry(interaction: discord.Interaction):
 async def unsubscribe(interaction: discord.Interaction):
     uid = interaction.user.id
     async with db_pool.acquire() as conn:
-        await conn.execute('UPDATE user_settings SET subscribed=FALSE, updates_enabled=FALSE WHERE user_id=$1', uid)
+        await conn.execute('UPDATE user_settings SET subscribed=FALSE, updates_enabled=FALSE, next_due=NULL WHERE user_id=$1', uid)
+    if user_registry.get(uid):
+        user_registry.update(uid, subscribed=False, updates_enabled=False)
+    await wake_scheduler()
     await interaction.response.send_message("You have been unsubscribed from job updates.", ephemeral=True)
 
 @client.tree.command(name="ping", description="Check if the bot is alive")
@@ -189,20 +785,20 @@ async def setkeywords(interaction: discord.Interaction, keywords: str):
     uid = interaction.user.id
     # Clean and normalize the input string
     keyword_list = [k.strip() for k in keywords.split(",") if k.strip()]
-    keywords_str = ", ".join(keyword_list)
+    # Check if user is already registered and if they are currently subscribed
+    row = user_registry.get(uid)
+    # If user is not currently subscribed and limit is reached, block resubscription
+    if (not row or not row["subscribed"]) and user_registry.is_full():
+        await interaction.response.send_message(f"❌ Sorry, the bot has reached the maximum number of users ({MAX_SUBSCRIBERS}). Please try again later or ask someone to unsubscribe.", ephemeral=True)
+        return
     async with db_pool.acquire() as conn:
-        # Check if user is already registered and if they are currently subscribed
-        row = await conn.fetchrow('SELECT subscribed FROM user_settings WHERE user_id=$1', uid)
-        user_count = await conn.fetchval('SELECT COUNT(*) FROM user_settings WHERE subscribed=TRUE')
-        # If user is not currently subscribed and limit is reached, block resubscription
-        if (not row or not row["subscribed"]) and user_count >= 18:
-            await interaction.response.send_message("❌ Sorry, the bot has reached the maximum number of users (18). Please try again later or ask someone to unsubscribe.", ephemeral=True)
-            return
         await conn.execute('''
             INSERT INTO user_settings (user_id, keywords, subscribed)
             VALUES ($1, $2, TRUE)
             ON CONFLICT (user_id) DO UPDATE SET keywords = $2, subscribed = TRUE
-        ''', uid, keywords_str)
+        ''', uid, keyword_list)
+    user_registry.update(uid, keywords=keyword_list, subscribed=True)
+    await wake_scheduler()
     msg = ("✅ Keywords saved (comma-separated, e.g. ai, ml, internship):\n" +
            "\n".join(f"• {k}" for k in keyword_list))
     await interaction.response.send_message(msg, ephemeral=True)
@@ -211,14 +807,11 @@ async def setkeywords(interaction: discord.Interaction, keywords: str):
 @user_limit_check
 async def showkeywords(interaction: discord.Interaction):
     uid = interaction.user.id
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT keywords FROM user_settings WHERE user_id=$1', uid)
+    row = user_registry.get(uid)
     if not row or not row["keywords"]:
         await interaction.response.send_message("📭 You haven't set any keywords yet.", ephemeral=True)
         return
-    keywords_str = row["keywords"]
-    keyword_list = [k.strip() for k in keywords_str.split(",") if k.strip()]
-    await interaction.response.send_message("Your saved keywords:\n• " + "\n• ".join(keyword_list), ephemeral=True)
+    await interaction.response.send_message("Your saved keywords:\n• " + "\n• ".join(row["keywords"]), ephemeral=True)
 
 @client.tree.command(name="clearkeywords", description="Clear your saved keywords")
 @user_limit_check
@@ -226,6 +819,8 @@ async def clearkeywords(interaction: discord.Interaction):
     uid = interaction.user.id
     async with db_pool.acquire() as conn:
         await conn.execute('UPDATE user_settings SET keywords=NULL WHERE user_id=$1', uid)
+    if user_registry.get(uid):
+        user_registry.update(uid, keywords=None)
     await interaction.response.send_message("Your keywords have been cleared.", ephemeral=True)
 
 @client.tree.command(name="setlocation", description="Set your preferred job location")
@@ -241,6 +836,7 @@ async def setlocation(interaction: discord.Interaction, location: str):
             VALUES ($1, $2)
             ON CONFLICT (user_id) DO UPDATE SET location = $2
         ''', uid, loc)
+    user_registry.update(uid, location=loc)
     await interaction.response.send_message(f"📍 Location saved: **{loc}**", ephemeral=True)
 
 @client.tree.command(name="clearlocation", description="Clear your saved location")
@@ -249,14 +845,15 @@ async def clearlocation(interaction: discord.Interaction):
     uid = interaction.user.id
     async with db_pool.acquire() as conn:
         await conn.execute('UPDATE user_settings SET location=NULL WHERE user_id=$1', uid)
+    if user_registry.get(uid):
+        user_registry.update(uid, location=None)
     await interaction.response.send_message("Your location has been cleared.", ephemeral=True)
 
 @client.tree.command(name="showlocation", description="Show your currently saved location")
 @user_limit_check
 async def showlocation(interaction: discord.Interaction):
     uid = interaction.user.id
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT location FROM user_settings WHERE user_id=$1', uid)
+    row = user_registry.get(uid)
     if not row or not row["location"]:
         await interaction.response.send_message("� You haven't set a location yet.", ephemeral=True)
         return
@@ -265,129 +862,1125 @@ async def showlocation(interaction: discord.Interaction):
 
 
 # ---- Background Job Task ----
+def resolve_delivery_channel(user_id, channel_id):
+    """Gateway-side channel lookup: the cached channel, if the user is still in its guild
+    and we're allowed to post there."""
+    channel = client.resolve_channel(channel_id)
+    if not channel or not channel.guild.get_member(user_id):
+        return None
+    if not channel.permissions_for(channel.guild.me).send_messages:
+        print(f"[ERROR] Missing permission to send in channel {channel.id} for user {user_id}")
+        return None
+    return channel
+
+async def deliver_to_user(row, now, resolve_channel):
+    """Deliver one due user's results. Returns True/False; exceptions propagate to the caller."""
+    user_id = row["user_id"]
+    channel = resolve_channel(user_id, row["channel_id"])
+    if not channel:
+        print(f"[ERROR] No valid channel set for user {user_id}")
+        return False
+    return await send_job_results(channel.id, user_id, row["keywords"], row["location"], row["country"], 4)
+
+async def claim_due_users(owner, now, limit):
+    """Lease up to limit users due at now to owner. SKIP LOCKED lets concurrent processes claim
+    disjoint batches; a lease left behind by a crashed process is reclaimable once it expires.
+
+    The lease runs from the moment of the claim, not from now, which may be the start of a
+    long cycle; hold it with leases_held while the batch is being delivered.
+    """
+    claimed_at = datetime.now(UTC)
+    async with db_pool.acquire() as conn:
+        return await conn.fetch('''
+            UPDATE user_settings AS u
+            SET lease_owner = $1, lease_expires = $5::timestamptz + $3::interval
+            FROM (
+                SELECT user_id FROM user_settings
+                WHERE next_due <= $2 AND updates_enabled AND subscribed AND keywords IS NOT NULL
+                  AND (lease_expires IS NULL OR lease_expires < $5)
+                ORDER BY next_due
+                LIMIT $4
+                FOR UPDATE SKIP LOCKED
+            ) AS due
+            WHERE u.user_id = due.user_id
+            RETURNING u.user_id, u.keywords, u.location, u.country, u.channel_id
+        ''', owner, now, DELIVERY_LEASE, limit, claimed_at)
+
+async def _renew_leases(table, key_column, ids, owner):
+    while True:
+        await asyncio.sleep(DELIVERY_LEASE.total_seconds() / 3)
+        try:
+            async with db_pool.acquire() as conn:
+                await conn.execute(
+                    f'UPDATE {table} SET lease_expires = $1 WHERE {key_column} = ANY($2) AND lease_owner = $3',
+                    datetime.now(UTC) + DELIVERY_LEASE, ids, owner)
+        except Exception as e:
+            print(f"[ERROR] Failed to renew {table} leases: {e!r}")
+
+@contextlib.asynccontextmanager
+async def leases_held(table, key_column, ids, owner):
+    """Keep owner's leases on these rows from expiring while the block runs, however long it takes."""
+    task = asyncio.create_task(_renew_leases(table, key_column, ids, owner))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+async def record_cycle(results, now, owner):
+    """Write a whole batch's bookkeeping back in one transaction and release its leases.
+
+    Delivered users move out by the delivery interval; everyone else is retried soon.
+    Rows whose lease has since passed to another process are left alone.
+    Seen jobs, outbox messages and archived jobs buffered during the batch are flushed on the
+    same connection. Those flushes write rows in key order, so two workers upserting the same
+    archived jobs lock them in the same order and can't deadlock.
+    """
+    user_ids = [user_id for user_id, _, _ in results]
+    next_due = [due for _, due, _ in results]
+    delivered = [ok for _, _, ok in results]
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute('''
+                UPDATE user_settings AS u
+                SET next_due = v.next_due,
+                    last_sent = CASE WHEN v.delivered THEN $4 ELSE u.last_sent END,
+                    lease_owner = NULL,
+                    lease_expires = NULL
+                FROM unnest($1::bigint[], $2::timestamptz[], $3::boolean[]) AS v(user_id, next_due, delivered)
+                WHERE u.user_id = v.user_id AND u.lease_owner = $5
+            ''', user_ids, next_due, delivered, now, owner)
+            await seen_jobs.flush(conn, user_ids)
+            await outbox.flush(conn)
+            await job_archive.flush(conn)
+
+async def run_delivery_cycle(rows, now, owner, resolve_channel):
+    """Fan deliveries out over a bounded worker pool so one slow user can't hold up the rest."""
+    semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+
+    async def worker(row):
+        async with semaphore:
+            try:
+                if await asyncio.wait_for(deliver_to_user(row, now, resolve_channel), DELIVERY_TIMEOUT):
+                    outcome = "succeeded"
+                else:
+                    outcome = "failed"
+            except asyncio.TimeoutError:
+                print(f"[ERROR] Delivery for user {row['user_id']} timed out after {DELIVERY_TIMEOUT}s")
+                outcome = "timed_out"
+            except Exception as e:
+                print(f"[ERROR] Delivery for user {row['user_id']} failed: {e!r}")
+                outcome = "failed"
+            return outcome
+
+    outcomes = await asyncio.gather(*(worker(row) for row in rows))
+    results = [(row["user_id"], now + (DELIVERY_INTERVAL if outcome == "succeeded" else DELIVERY_RETRY_DELAY),
+                outcome == "succeeded") for row, outcome in zip(rows, outcomes)]
+    try:
+        await record_cycle(results, now, owner)
+    except Exception as e:
+        print(f"[ERROR] Failed to record delivery cycle: {e!r}")
+    try:
+        await outbox.drain(owner, resolve_channel)
+    except Exception as e:
+        print(f"[ERROR] Failed to drain delivery outbox: {e!r}")
+    counts = {"succeeded": 0, "failed": 0, "timed_out": 0}
+    for outcome in outcomes:
+        counts[outcome] += 1
+    return counts
+
+async def run_due_deliveries(now, owner, resolve_channel=resolve_delivery_channel):
+    """Claim and deliver to everyone due at now, one leased batch at a time.
+
+    Returns the cycle's outcome counts, or None if nobody was due.
+    """
+    async with db_pool.acquire() as conn:
+        backlog = await conn.fetchval('''
+            SELECT count(*) FROM user_settings
+            WHERE next_due <= $1 AND updates_enabled AND subscribed AND keywords IS NOT NULL
+        ''', now)
+    DELIVERY_DUE_USERS.set(backlog)
+    if not backlog:
+        return None
+    started = time.monotonic()
+    counts = {"succeeded": 0, "failed": 0, "timed_out": 0}
+    total = 0
+    while True:
+        due = await claim_due_users(owner, now, DELIVERY_BATCH_SIZE)
+        if not due:
+            break
+        async with leases_held("user_settings", "user_id", [row["user_id"] for row in due], owner):
+            await seen_jobs.refresh_users([row["user_id"] for row in due])
+            allowed = api_limiter.delivery_allowance(len(due))
+            if allowed < len(due):
+                deferred = due[allowed:]
+                due = due[:allowed]
+                await record_cycle([(row["user_id"], now + QUOTA_DEFER_DELAY, False) for row in deferred],
+                                   now, owner)
+                print(f"[INFO] {api_limiter.quota_remaining} API requests left this month; "
+                      f"deferring {len(deferred)} deliveries")
+            if not due:
+                break
+            total += len(due)
+            for outcome, count in (await run_delivery_cycle(due, now, owner, resolve_channel)).items():
+                counts[outcome] += count
+    if not total:
+        return None
+    elapsed = time.monotonic() - started
+    DELIVERY_CYCLE_SECONDS.observe(elapsed)
+    for outcome, count in counts.items():
+        DELIVERIES_TOTAL.inc(count, outcome=outcome)
+    print(f"[INFO] Delivery cycle: {total} delivered by {owner}, {counts['succeeded']} succeeded, "
+          f"{counts['failed']} failed, {counts['timed_out']} timed out "
+          f"in {elapsed:.1f}s")
+    log_event("delivery_cycle", owner=owner, due=total, seconds=round(elapsed, 3), **counts)
+    return counts
+
+async def wake_scheduler():
+    """Tell every scheduler (this process and any workers) that a schedule changed."""
+    schedule_changed.set()
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute('SELECT pg_notify($1, \'\')', SCHEDULE_CHANNEL)
+    except Exception as e:
+        print(f"[ERROR] Failed to notify schedulers: {e!r}")
+
+async def listen_for_schedule_changes():
+    """Dedicated connection that wakes the local scheduler on NOTIFYs from other processes."""
+    conn = await asyncpg.connect(PG_DSN)
+    await conn.add_listener(SCHEDULE_CHANNEL, lambda *args: schedule_changed.set())
+    return conn
+
+def delivery_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+async def scheduler_loop(owner, resolve_channel=resolve_delivery_channel, running=lambda: True):
+    while running():
+        try:
+            await seen_jobs.maybe_purge()
+            await outbox.maybe_purge()
+            await job_archive.maybe_purge()
+        except Exception as e:
+            print(f"[ERROR] Failed to purge expired rows: {e!r}")
+        # Retries, and anything left pending by a previous run of this or another process
+        try:
+            await outbox.drain(owner, resolve_channel)
+        except Exception as e:
+            print(f"[ERROR] Failed to drain delivery outbox: {e!r}")
+        await run_due_deliveries(datetime.now(UTC), owner, resolve_channel)
+        # Clear before reading the next due time so a change made meanwhile still wakes us
+        schedule_changed.clear()
+        async with db_pool.acquire() as conn:
+            # A row leased elsewhere only becomes ours to retry once its lease runs out
+            next_due = await conn.fetchval('''
+                SELECT min(GREATEST(next_due, lease_expires)) FROM user_settings
+                WHERE updates_enabled AND subscribed AND keywords IS NOT NULL
+            ''')
+            next_retry = await outbox.next_attempt(conn)
+        wake_at = min((t for t in (next_due, next_retry) if t is not None), default=None)
+        delay = SCHEDULER_MAX_SLEEP
+        if wake_at is not None:
+            delay = min(max((wake_at - datetime.now(UTC)).total_seconds(), 0), SCHEDULER_MAX_SLEEP)
+        try:
+            await asyncio.wait_for(schedule_changed.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+async def supervise_scheduler(owner, resolve_channel=resolve_delivery_channel, running=lambda: True):
+    """Run scheduler_loop, restarting it with backoff if it ever crashes (e.g. the DB is briefly down)."""
+    failures = 0
+    while running():
+        try:
+            await scheduler_loop(owner, resolve_channel, running)
+        except Exception as e:
+            failures += 1
+            delay = retry_delay(min(failures, 5))
+            print(f"[ERROR] Scheduler crashed ({e!r}); restarting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
 async def job_update_task():
+    """The gateway process's scheduler."""
     await client.wait_until_ready()
-    while not client.is_closed():
-        now = datetime.now(UTC)
+    await supervise_scheduler(delivery_owner(), running=lambda: not client.is_closed())
+
+# ---- Seen Jobs Store ----
+class SeenJobStore:
+    """Which job_ids each user has already been sent, persisted in seen_jobs.
+
+    Users claimed for a delivery batch get their exact seen set loaded up front
+    (refresh_users), so a batch needs one query rather than one per user. Anyone else is
+    checked against Postgres directly. Entries expire after SEEN_JOBS_WINDOW.
+    """
+
+    def __init__(self):
+        self._last_purge = 0.0
+        # (user_id, job_id) pairs delivered but not written yet; see flush()
+        self._pending = set()
+        # user_id -> exact seen job_ids, for users loaded by refresh_users until their flush()
+        self._exact = {}
+
+    async def maybe_purge(self):
+        """Delete entries older than SEEN_JOBS_WINDOW."""
+        if time.monotonic() - self._last_purge < SEEN_JOBS_PURGE_INTERVAL:
+            return
         async with db_pool.acquire() as conn:
-            rows = await conn.fetch('SELECT user_id, keywords, location, last_sent FROM user_settings WHERE keywords IS NOT NULL AND updates_enabled=TRUE AND subscribed=TRUE')
+            await conn.execute('DELETE FROM seen_jobs WHERE seen_at < $1', datetime.now(UTC) - SEEN_JOBS_WINDOW)
+        self._last_purge = time.monotonic()
+
+    async def refresh_users(self, user_ids):
+        """Load these users' exact seen sets in one query, including jobs other processes recorded."""
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                'SELECT user_id, job_id FROM seen_jobs WHERE user_id = ANY($1::bigint[]) AND seen_at >= $2',
+                user_ids, datetime.now(UTC) - SEEN_JOBS_WINDOW)
+        for user_id in user_ids:
+            self._exact[user_id] = set()
         for row in rows:
-            last_sent_str = row["last_sent"]
-            last_sent = None
-            if last_sent_str:
+            self._exact[row["user_id"]].add(row["job_id"])
+
+    async def filter_new(self, user_id, jobs):
+        exact = self._exact.get(user_id)
+        if exact is not None:
+            return [job for job in jobs if job.get("job_id") not in exact]
+        job_ids = [job["job_id"] for job in jobs if job.get("job_id")]
+        seen = set()
+        if job_ids:
+            async with db_pool.acquire() as conn:
+                rows = await conn.fetch(
+                    'SELECT job_id FROM seen_jobs WHERE user_id=$1 AND job_id = ANY($2::text[]) AND seen_at >= $3',
+                    user_id, job_ids, datetime.now(UTC) - SEEN_JOBS_WINDOW)
+            seen = {row["job_id"] for row in rows}
+        return [job for job in jobs
+                if job.get("job_id") not in seen and (user_id, job.get("job_id")) not in self._pending]
+
+    def mark_seen(self, user_id, jobs):
+        """Remember delivered jobs in memory; they reach Postgres on the next flush()."""
+        for job in jobs:
+            if job.get("job_id"):
+                self._pending.add((user_id, job["job_id"]))
+                if user_id in self._exact:
+                    self._exact[user_id].add(job["job_id"])
+
+    async def flush(self, conn, user_ids):
+        """Write every delivered job, and drop the exact sets of user_ids, whose turn is over."""
+        for user_id in user_ids:
+            self._exact.pop(user_id, None)
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, set()
+        rows = sorted(pending)
+        try:
+            await conn.execute('''
+                INSERT INTO seen_jobs (user_id, job_id)
+                SELECT * FROM unnest($1::bigint[], $2::text[])
+                ON CONFLICT (user_id, job_id) DO UPDATE SET seen_at = now()
+            ''', [user_id for user_id, _ in rows], [job_id for _, job_id in rows])
+        except Exception:
+            self._pending |= pending
+            raise
+
+seen_jobs = SeenJobStore()
+
+# ---- Discord Delivery ----
+def pack_messages(sections, limit=DISCORD_MESSAGE_LIMIT):
+    """Pack text sections into as few messages of at most limit chars as possible.
+
+    Sections are split on line boundaries (and a single over-long line is hard-split).
+    Returns a list of (content, set of section indexes that have text in it).
+    """
+    messages = []
+    current, owners = "", set()
+    for index, section in enumerate(sections):
+        for line in section.splitlines(keepends=True):
+            while line:
+                if len(current) + len(line) > limit and current:
+                    messages.append((current, owners))
+                    current, owners = "", set()
+                piece, line = line[:limit], line[limit:]
+                current += piece
+                owners.add(index)
+    if current:
+        messages.append((current, owners))
+    return messages
+
+class ChannelDispatcher:
+    """One send queue per channel.
+
+    Sections queued for a channel within DISCORD_BATCH_LINGER seconds are packed together
+    with pack_messages and sent one message at a time; interactive sends skip the wait. Each channel therefore has a single
+    request in flight, and discord.py's per-route rate-limit handling never races itself.
+    """
+
+    def __init__(self):
+        self._pending = {}  # channel_id -> [(text, future)]
+        self._workers = {}  # channel_id -> asyncio.Task
+        self._hurry = {}  # channel_id -> asyncio.Event, set when someone is waiting on a send
+
+    async def deliver(self, channel, text, linger=True):
+        """Queue text for channel; resolves to True once every part of it has been sent.
+
+        If the caller is cancelled before its text has been picked up, the text is dropped.
+        With linger off, the channel's batch is sent without waiting for more sections to join it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        entry = (text, future)
+        self._pending.setdefault(channel.id, []).append(entry)
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel))
+        if not linger:
+            self._hurry.setdefault(channel.id, asyncio.Event()).set()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            pending = self._pending.get(channel.id)
+            if pending and entry in pending:
+                pending.remove(entry)
+            raise
+
+    async def _drain(self, channel):
+        hurry = self._hurry.setdefault(channel.id, asyncio.Event())
+        try:
+            while True:
                 try:
-                    last_sent = datetime.fromisoformat(last_sent_str)
-                    # Make sure last_sent is timezone-aware (UTC)
-                    if last_sent.tzinfo is None:
-                        last_sent = last_sent.replace(tzinfo=UTC)
-                except Exception:
-                    last_sent = None
-            if not last_sent or (now - last_sent).total_seconds() >= 4 * 24 * 60 * 60:
-                # Find the user's channel and guild
-                user_id = row["user_id"]
-                channel_id = None
-                for g in client.guilds:
-                    member = g.get_member(user_id)
-                    if member:
-                        async with db_pool.acquire() as conn:
-                            ch_row = await conn.fetchrow('SELECT channel_id FROM user_settings WHERE user_id=$1', user_id)
-                        channel_id = ch_row["channel_id"] if ch_row else None
-                        break
-                if channel_id:
-                    channel = None
-                    for g in client.guilds:
-                        ch = g.get_channel(channel_id)
-                        if ch:
-                            channel = ch
-                            break
-                    if channel:
-                        success = await send_job_results(channel.guild, user_id, row["keywords"], row["location"], 4)
-                        if success:
-                            async with db_pool.acquire() as conn:
-                                await conn.execute('UPDATE user_settings SET last_sent=$1 WHERE user_id=$2', now.isoformat(), user_id)
-        await asyncio.sleep(60 * 10)  # Check every 10 minutes
+                    await asyncio.wait_for(hurry.wait(), DISCORD_BATCH_LINGER)
+                except asyncio.TimeoutError:
+                    pass
+                hurry.clear()
+                # Skip anything whose caller gave up waiting; nobody would record it as sent
+                batch = [entry for entry in self._pending.pop(channel.id, []) if not entry[1].done()]
+                if not batch:
+                    return
+                failed = set()
+                for content, owners in pack_messages([text for text, _ in batch]):
+                    if owners <= failed:
+                        continue
+                    started = time.monotonic()
+                    try:
+                        await channel.send(content)
+                    except discord.Forbidden:
+                        print(f"[ERROR] Cannot send message in channel {channel.id} (forbidden)")
+                        failed.update(range(len(batch)))
+                    except Exception as e:
+                        # A 429 raised here was already logged, and so counted, by discord.http
+                        print(f"[ERROR] Failed to send message in channel {channel.id}: {e}")
+                        failed.update(owners)
+                    finally:
+                        elapsed = time.monotonic() - started
+                        DISCORD_SEND_SECONDS.observe(elapsed)
+                        log_event("discord_send", channel_id=channel.id, chars=len(content),
+                                  seconds=round(elapsed, 4))
+                for index, (_, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(index not in failed)
+        finally:
+            self._workers.pop(channel.id, None)
+            self._hurry.pop(channel.id, None)
+            # Don't leave anyone waiting if the worker dies
+            for _, future in self._pending.pop(channel.id, []):
+                if not future.done():
+                    future.set_result(False)
 
-# ---- Helper: Send Job Results ----
-async def send_job_results(guild, user_id, keywords, location, days_limit=4):
-    try:
-        # Fetch channel_id and country from DB
+dispatcher = ChannelDispatcher()
+
+# ---- Delivery Outbox ----
+def outbox_retry_delay(attempts):
+    """Jittered exponential backoff between outbox send attempts."""
+    return min(OUTBOX_RETRY_CAP, OUTBOX_RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1)
+
+class DeliveryOutbox:
+    """Durable queue of rendered job-result messages, persisted in delivery_outbox.
+
+    send_job_results only queues its message here; it reaches Postgres in the same transaction
+    as the user's schedule and seen jobs (flush), and drain() sends it afterwards. A failed
+    send is retried with backoff up to OUTBOX_MAX_ATTEMPTS times and then dead-lettered, and
+    pending rows survive restarts, so results are never refetched just to resend them.
+    The idempotency key covers the user and the exact jobs, so the same results can't be
+    queued twice; rows are leased while sending, like due users in claim_due_users.
+    """
+
+    def __init__(self):
+        self._pending = []  # (idempotency_key, user_id, channel_id, content) not written yet
+        self._last_purge = 0.0
+
+    @staticmethod
+    def idempotency_key(user_id, jobs):
+        job_ids = "\n".join(sorted(job.get("job_id") or "" for job in jobs))
+        return f"{user_id}:{hashlib.blake2b(job_ids.encode(), digest_size=16).hexdigest()}"
+
+    def add(self, user_id, channel_id, content, jobs):
+        self._pending.append((self.idempotency_key(user_id, jobs), user_id, channel_id, content))
+
+    async def flush(self, conn):
+        """Write queued messages; returns (id, user_id) for the rows actually inserted."""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, []
+        try:
+            return await conn.fetch('''
+                INSERT INTO delivery_outbox (idempotency_key, user_id, channel_id, content)
+                SELECT * FROM unnest($1::text[], $2::bigint[], $3::bigint[], $4::text[])
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING id, user_id
+            ''', *(list(column) for column in zip(*pending)))
+        except Exception:
+            self._pending = pending + self._pending
+            raise
+
+    async def _claim(self, owner, now, cutoff, ids):
         async with db_pool.acquire() as conn:
-            row = await conn.fetchrow('SELECT channel_id, country, subscribed FROM user_settings WHERE user_id=$1', user_id)
-        if not row or not row.get("subscribed", True):
-            print(f"[INFO] User {user_id} is not subscribed. Skipping job delivery.")
-            return False
-        channel_id = row["channel_id"] if row else None
-        country = row["country"] if row and row["country"] else "us"
-        channel = None
-        if channel_id:
-            # Find the channel in any guild
-            for g in client.guilds:
-                ch = g.get_channel(channel_id)
-                if ch:
-                    channel = ch
-                    break
-        if not channel or not channel.permissions_for(channel.guild.me).send_messages:
-            print(f"[ERROR] No valid channel set for user {user_id}")
-            return False
-        # Convert keywords string to list for concatenation
-        keyword_list = [k.strip() for k in (keywords or "").split(",") if k.strip()]
-        location = location or ""
-        days_limit = 4
-        query_parts = keyword_list + ([location] if location else [])
-        query = "+".join(query_parts)
-        url = f"https://jsearch.p.rapidapi.com/search?query={query}&page=1&num_pages=1&country={country}"
-        headers = {
-            "X-RapidAPI-Key": RAPIDAPI_KEY,
-            "X-RapidAPI-Host": "jsearch.p.rapidapi.com"
-        }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status != 200:
-                    print(f"[ERROR] API returned status {response.status} for user {user_id}")
+            return await conn.fetch('''
+                UPDATE delivery_outbox AS o
+                SET lease_owner = $1, lease_expires = $2::timestamptz + $3::interval
+                FROM (
+                    SELECT id FROM delivery_outbox
+                    WHERE status = 'pending' AND next_attempt <= $6
+                      AND (lease_expires IS NULL OR lease_expires < $2)
+                      AND ($5::bigint[] IS NULL OR id = ANY($5::bigint[]))
+                    ORDER BY id
+                    LIMIT $4
+                    FOR UPDATE SKIP LOCKED
+                ) AS due
+                WHERE o.id = due.id
+                RETURNING o.id, o.user_id, o.channel_id, o.content, o.attempts
+            ''', owner, now, DELIVERY_LEASE, OUTBOX_BATCH_SIZE, ids, cutoff)
+
+    async def _send(self, row, resolve_channel, linger):
+        """Try one message; returns None once it's sent, otherwise why it wasn't."""
+        channel = resolve_channel(row["user_id"], row["channel_id"])
+        if not channel:
+            return "channel unavailable"
+        # No timeout here: a message abandoned mid-send could still be posted after we'd
+        # recorded it as failed, and then posted again on retry. The leases are renewed instead.
+        try:
+            if await dispatcher.deliver(channel, row["content"], linger):
+                return None
+            return "send failed"
+        except Exception as e:
+            return repr(e)
+
+    async def drain(self, owner, resolve_channel, ids=None, linger=True):
+        """Send every pending message that's due (or just ids), one leased batch at a time.
+
+        Each message is tried at most once per call. Returns the ids that were sent. Someone
+        waiting on the result passes linger=False to skip the Discord batching delay.
+        """
+        sent = []
+        started = datetime.now(UTC)
+        while True:
+            now = datetime.now(UTC)
+            rows = await self._claim(owner, now, started, ids)
+            if not rows:
+                return sent
+            async with leases_held("delivery_outbox", "id", [row["id"] for row in rows], owner):
+                errors = await asyncio.gather(*(self._send(row, resolve_channel, linger) for row in rows))
+            next_attempt = []
+            for row, error in zip(rows, errors):
+                attempts = row["attempts"] + 1
+                next_attempt.append(now + timedelta(seconds=outbox_retry_delay(attempts)))
+                if error is None:
+                    OUTBOX_SENDS_TOTAL.inc(result="sent")
+                    sent.append(row["id"])
+                elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                    OUTBOX_SENDS_TOTAL.inc(result="dead")
+                    print(f"[ERROR] Giving up on outbox message {row['id']} for user {row['user_id']} "
+                          f"after {attempts} attempts: {error}")
+                else:
+                    OUTBOX_SENDS_TOTAL.inc(result="retry")
+            async with db_pool.acquire() as conn:
+                await conn.execute('''
+                    UPDATE delivery_outbox AS o
+                    SET attempts = o.attempts + 1,
+                        status = CASE
+                            WHEN v.error IS NULL THEN 'sent'
+                            WHEN o.attempts + 1 >= $5 THEN 'dead'
+                            ELSE 'pending'
+                        END,
+                        sent_at = CASE WHEN v.error IS NULL THEN $4::timestamptz END,
+                        next_attempt = v.next_attempt,
+                        last_error = v.error,
+                        lease_owner = NULL,
+                        lease_expires = NULL
+                    FROM unnest($1::bigint[], $2::text[], $3::timestamptz[]) AS v(id, error, next_attempt)
+                    WHERE o.id = v.id AND o.lease_owner = $6
+                ''', [row["id"] for row in rows], errors, next_attempt, now, OUTBOX_MAX_ATTEMPTS, owner)
+
+    async def in_flight(self, ids, owner):
+        """Which of ids are sent or being sent by another owner, so need nothing from owner."""
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id FROM delivery_outbox
+                WHERE id = ANY($1::bigint[])
+                  AND (status = 'sent' OR (lease_owner <> $2 AND lease_expires > now()))
+            ''', ids, owner)
+        return [row["id"] for row in rows]
+
+    async def next_attempt(self, conn):
+        """When the earliest pending message becomes sendable (by anyone), or None."""
+        return await conn.fetchval('''
+            SELECT min(GREATEST(next_attempt, lease_expires)) FROM delivery_outbox WHERE status = 'pending'
+        ''')
+
+    async def maybe_purge(self):
+        """Drop sent and dead-lettered rows older than OUTBOX_RETENTION."""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        async with db_pool.acquire() as conn:
+            await conn.execute("DELETE FROM delivery_outbox WHERE status <> 'pending' AND created_at < $1",
+                               datetime.now(UTC) - OUTBOX_RETENTION)
+        self._last_purge = time.monotonic()
+
+outbox = DeliveryOutbox()
+
+# ---- RapidAPI Rate Limiter ----
+class RapidApiLimiter:
+    """Token bucket for the plan's per-second limit, plus the monthly quota RapidAPI reports.
+
+    Every JSearch request takes a token first. A 429 pauses the whole bucket, so all callers
+    back off together instead of each hammering the API on its own schedule.
+    """
+
+    def __init__(self, rate, burst, monthly_quota):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.monthly_quota = monthly_quota
+        # From the x-ratelimit-requests-* headers; None until the first response
+        self.quota_remaining = None
+        self._quota_resets_at = None  # monotonic time the quota resets, if the API said
+        self._quota_checked = time.monotonic()  # last time quota_remaining was updated or probed
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record(self, headers):
+        limit = headers.get("X-RateLimit-Requests-Limit")
+        remaining = headers.get("X-RateLimit-Requests-Remaining")
+        reset = headers.get("X-RateLimit-Requests-Reset")  # seconds until the quota resets
+        try:
+            if limit is not None:
+                self.monthly_quota = int(limit)
+            if remaining is not None:
+                self.quota_remaining = int(remaining)
+                self._quota_checked = time.monotonic()
+            if reset is not None:
+                self._quota_resets_at = time.monotonic() + float(reset)
+        except ValueError:
+            pass
+
+    def delivery_allowance(self, due_count):
+        """How many of due_count scheduled deliveries to run now, given the quota left."""
+        now = time.monotonic()
+        if self._quota_resets_at is not None and now >= self._quota_resets_at:
+            # New billing period: nothing is known until the next response says otherwise
+            self.quota_remaining = None
+            self._quota_resets_at = None
+        if self.quota_remaining is None or not self.monthly_quota:
+            return due_count
+        if self.quota_remaining <= RAPIDAPI_QUOTA_RESERVE:
+            # Nothing else may call the API in this process (a worker), so quota_remaining
+            # would never change; let one delivery through now and then to probe it
+            if now - self._quota_checked >= QUOTA_DEFER_DELAY.total_seconds():
+                self._quota_checked = now
+                return min(1, due_count)
+            return 0
+        fraction = self.quota_remaining / self.monthly_quota
+        if fraction >= RAPIDAPI_QUOTA_SLOWDOWN:
+            return due_count
+        return max(1, int(due_count * fraction / RAPIDAPI_QUOTA_SLOWDOWN))
+
+api_limiter = RapidApiLimiter(RAPIDAPI_RATE_PER_SEC, RAPIDAPI_BURST, RAPIDAPI_MONTHLY_QUOTA)
+
+def retry_delay(attempt, headers=None):
+    """Honour Retry-After when the API sends it, otherwise full-jitter exponential backoff."""
+    if headers is not None:
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), API_BACKOFF_CAP)
+            except ValueError:
+                pass
+    return random.uniform(0, min(API_BACKOFF_CAP, API_BACKOFF_BASE * 2 ** attempt))
+
+# ---- Job Result Cache ----
+class JobResultCache:
+    """TTL + LRU cache for JSearch results, shared by every user with the same query.
+
+    Concurrent lookups for a key that is not cached yet share a single in-flight request.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expires_at, jobs)
+        self._inflight = {}  # key -> asyncio.Task
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    async def get_or_fetch(self, key, fetch):
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, jobs = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return jobs
+            del self._entries[key]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        # Shield so a cancelled waiter doesn't cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _store(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        jobs = task.result()
+        if jobs is None:
+            # Failed lookups are not cached so the next caller retries
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, jobs)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+job_cache = JobResultCache(JOB_CACHE_TTL, JOB_CACHE_SIZE)
+
+def job_query_key(keyword_list, location, country):
+    """Normalize a search so users with the same terms share one cache entry."""
+    keywords = tuple(sorted({k.strip().lower() for k in keyword_list if k.strip()}))
+    return keywords, (location or "").strip().lower(), country
+
+def date_posted_filter(days_limit):
+    """Narrowest JSearch date_posted bucket that still covers the last days_limit days."""
+    if days_limit <= 1:
+        return "today"
+    if days_limit <= 3:
+        return "3days"
+    if days_limit <= 7:
+        return "week"
+    return "month"
+
+async def fetch_jobs(key, page=1, date_posted="all"):
+    """Fetch one page of raw JSearch results for a normalized query key. Returns None on failure."""
+    keywords, location, country = key
+    query = "+".join(list(keywords) + ([location] if location else []))
+    url = (f"{JSEARCH_URL}?query={query}&page={page}&num_pages=1"
+           f"&country={country}&date_posted={date_posted}")
+    headers = {
+        "X-RapidAPI-Key": RAPIDAPI_KEY,
+        "X-RapidAPI-Host": JSEARCH_HOST
+    }
+    for attempt in range(API_MAX_RETRIES + 1):
+        await api_limiter.acquire()
+        response_headers = None
+        started = time.monotonic()
+        status_label = "error"
+        try:
+            async with api_session.get(url, headers=headers) as response:
+                status_label = str(response.status)
+                api_limiter.record(response.headers)
+                if response.status == 200:
                     try:
+                        data = await response.json()
+                    except Exception as e:
+                        print(f"[ERROR] Failed to parse JSON for query {query!r}: {e}")
                         text = await response.text()
-                        print(f"[ERROR] API response: {text[:500]}")
-                    except Exception:
-                        pass
-                    return False
+                        print(f"[ERROR] API response (non-JSON): {text[:500]}")
+                        return None
+                    return data.get("data", [])
+                print(f"[ERROR] API returned status {response.status} for query {query!r}")
                 try:
-                    data = await response.json()
-                except Exception as e:
-                    print(f"[ERROR] Failed to parse JSON for user {user_id}: {e}")
                     text = await response.text()
-                    print(f"[ERROR] API response (non-JSON): {text[:500]}")
-                    return False
-                jobs = data.get("data", [])
-                cutoff = datetime.now(UTC) - timedelta(days=days_limit)
-                recent_jobs = []
-                for job in jobs:
-                    posted_at = job.get("job_posted_at_datetime_utc")
-                    if not posted_at:
-                        continue
-                    try:
-                        posted_dt = datetime.strptime(posted_at, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=UTC)
-                    except Exception as e:
-                        print(f"[ERROR] Invalid date format for job: {posted_at} ({e})")
-                        continue
-                    if posted_dt > cutoff:
-                        recent_jobs.append(job)
-                    if len(recent_jobs) >= 20:
-                        break
-                if not recent_jobs:
-                    print(f"[INFO] No recent jobs found for user {user_id}")
-                    return True
-                msg = f"<@{user_id}> Top Recent Job Results:\n"
-                for job in recent_jobs:
-                    # Use plain links in < > to suppress Discord embeds
-                    msg += f"• {job['job_title']} at {job['employer_name']}: <{job['job_apply_link']}>\n"
+                    print(f"[ERROR] API response: {text[:500]}")
+                except Exception:
+                    pass
+                if response.status != 429 and response.status < 500:
+                    return None
+                response_headers = response.headers
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[ERROR] API request failed for query {query!r}: {e!r}")
+            status = None
+        finally:
+            elapsed = time.monotonic() - started
+            JSEARCH_REQUEST_SECONDS.observe(elapsed, status=status_label)
+            log_event("jsearch_request", query=query, page=page, status=status_label,
+                      seconds=round(elapsed, 4), quota_remaining=api_limiter.quota_remaining)
+        if attempt == API_MAX_RETRIES:
+            break
+        delay = retry_delay(attempt, response_headers)
+        if status == 429:
+            api_limiter.pause(delay)
+        await asyncio.sleep(delay)
+    print(f"[ERROR] Giving up on query {query!r} after {API_MAX_RETRIES + 1} attempts")
+    return None
+
+class JobFetchError(Exception):
+    pass
+
+def parse_posted_at(job):
+    posted_at = job.get("job_posted_at_datetime_utc")
+    if not posted_at:
+        return None
+    try:
+        return datetime.strptime(posted_at, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=UTC)
+    except Exception as e:
+        print(f"[ERROR] Invalid date format for job: {posted_at} ({e})")
+        return None
+
+def job_page_key(key, days_limit, page):
+    return key, date_posted_filter(days_limit), page
+
+async def iter_recent_jobs(key, days_limit, max_pages=JOB_MAX_PAGES):
+    """Yield jobs posted within days_limit, one page at a time, requesting pages only as needed.
+
+    Stops after max_pages, at an empty page, or at a page with nothing inside the cutoff.
+    The consumer can stop early simply by not asking for the next page. Raises JobFetchError
+    if the first page can't be fetched; a later page failing just ends the stream.
+    """
+    cutoff = datetime.now(UTC) - timedelta(days=days_limit)
+    date_posted = date_posted_filter(days_limit)
+    for page in range(1, max_pages + 1):
+        # Pages are cached separately, so users sharing a query also share every page
+        jobs = await job_cache.get_or_fetch(job_page_key(key, days_limit, page),
+                                            lambda page=page: fetch_jobs(key, page, date_posted))
+        if jobs is None:
+            if page == 1:
+                raise JobFetchError(f"Failed to fetch jobs for {key}")
+            return
+        recent = []
+        for job in jobs:
+            posted_dt = parse_posted_at(job)
+            if posted_dt and posted_dt > cutoff:
+                recent.append(job)
+        if recent:
+            yield recent
+        if not recent or len(jobs) < 10:
+            # JSearch returns 10 jobs per page; a short page is the last one
+            return
+
+# ---- Job Archive ----
+class JobArchive:
+    """Every job fetched from JSearch, in job_archive with a full-text index, kept for
+    ARCHIVE_RETENTION.
+
+    archive_queries remembers, per normalized query, when it was last fetched, which jobs
+    JSearch returned, and whether paging ran to the end. While that is within
+    ARCHIVE_STALE_AFTER, lookup() serves exactly those jobs. Interactive callers may also take a stale query, answered by a full-text search of
+    the archive, while a background refresh brings it up to date for the next caller.
+    Fetched jobs and refreshes are buffered and written by flush(), like seen jobs and outbox
+    messages.
+    """
+
+    def __init__(self):
+        self._jobs = {}  # job_id -> row tuple, not written yet
+        self._refreshed = {}  # query_key -> (refreshed_at, job_ids, complete), not written yet
+        self._refreshing = {}  # query_key -> background refresh task
+        self._last_purge = 0.0
+
+    @staticmethod
+    def query_key(key):
+        keywords, location, country = key
+        return json.dumps([list(keywords), location, country])
+
+    @staticmethod
+    def _as_job(row):
+        return {
+            "job_id": row["job_id"], "job_title": row["title"], "employer_name": row["employer"],
+            "job_apply_link": row["apply_link"], "job_city": row["city"], "job_state": row["state"],
+            "job_is_remote": row["is_remote"], "job_country": row["country"].upper(),
+            "job_description": row["description"],
+            "job_posted_at_datetime_utc": row["posted_at"].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        }
+
+    def add(self, key, jobs):
+        country = key[2]
+        for job in jobs:
+            if job.get("job_id"):
+                self._jobs[job["job_id"]] = (
+                    job["job_id"], country, job.get("job_title"), job.get("employer_name"),
+                    job.get("job_apply_link"), job.get("job_city"), job.get("job_state"),
+                    bool(job.get("job_is_remote")), job.get("job_description"), parse_posted_at(job))
+
+    def mark_refreshed(self, key, jobs, complete=True):
+        """Record that jobs are what JSearch just returned for key, newest first.
+
+        complete is False when paging stopped before the last page.
+        """
+        self.add(key, jobs)
+        self._refreshed[self.query_key(key)] = (
+            datetime.now(UTC), [job["job_id"] for job in jobs if job.get("job_id")], complete)
+
+    async def flush(self, conn):
+        jobs, self._jobs = self._jobs, {}
+        refreshed, self._refreshed = self._refreshed, {}
+        try:
+            if jobs:
+                await conn.execute('''
+                    INSERT INTO job_archive
+                        (job_id, country, title, employer, apply_link, city, state, is_remote, description, posted_at)
+                    SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[],
+                                         $6::text[], $7::text[], $8::boolean[], $9::text[], $10::timestamptz[])
+                    ON CONFLICT (job_id) DO UPDATE SET
+                        title = EXCLUDED.title, employer = EXCLUDED.employer, apply_link = EXCLUDED.apply_link,
+                        city = EXCLUDED.city, state = EXCLUDED.state, is_remote = EXCLUDED.is_remote,
+                        description = EXCLUDED.description, posted_at = EXCLUDED.posted_at, fetched_at = now()
+                ''', *(list(column) for column in zip(*(jobs[job_id] for job_id in sorted(jobs)))))
+            if refreshed:
+                # Job id lists differ in length, so they can't go through one unnest
+                await conn.executemany('''
+                    INSERT INTO archive_queries (query_key, refreshed_at, job_ids, complete)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (query_key) DO UPDATE SET refreshed_at = $2, job_ids = $3, complete = $4
+                ''', [(query_key, *refreshed[query_key]) for query_key in sorted(refreshed)])
+        except Exception:
+            self._jobs = {**jobs, **self._jobs}
+            self._refreshed = {**refreshed, **self._refreshed}
+            raise
+
+    async def lookup(self, key, days_limit, allow_stale=False, max_age=ARCHIVE_STALE_AFTER):
+        """(jobs, complete): archived results for key posted within days_limit, shaped like
+        JSearch results, and whether they are all the live API would page through.
+
+        Returns None when the live API should be asked instead: the query was never fetched,
+        or it is older than max_age and allow_stale is off.
+        """
+        keywords, location, country = key
+        now = datetime.now(UTC)
+        cutoff = now - timedelta(days=days_limit)
+        async with db_pool.acquire() as conn:
+            # Refreshes still buffered don't count: their jobs aren't in job_archive yet
+            rows = await conn.fetch('''
+                SELECT q.refreshed_at, q.complete, a.job_id, a.country, a.title, a.employer, a.apply_link, a.city,
+                       a.state, a.is_remote, a.description, a.posted_at
+                FROM archive_queries AS q
+                LEFT JOIN LATERAL unnest(q.job_ids) WITH ORDINALITY AS k(job_id, position) ON TRUE
+                LEFT JOIN job_archive AS a ON a.job_id = k.job_id AND a.posted_at > $2
+                WHERE q.query_key = $1
+                ORDER BY k.position
+            ''', self.query_key(key), cutoff)
+            if rows and rows[0]["refreshed_at"] >= now - max_age:
+                ARCHIVE_LOOKUPS_TOTAL.inc(result="fresh")
+                return [self._as_job(row) for row in rows if row["job_id"]], rows[0]["complete"]
+            if not rows or not allow_stale:
+                ARCHIVE_LOOKUPS_TOTAL.inc(result="miss")
+                return None
+            # Stale: search everything archived since, which includes jobs other queries fetched.
+            # phraseto_tsquery tokenizes keywords the way to_tsvector tokenized the stored text,
+            # which drops symbols ("c++" and "c#" both become "c"), so those must also match as text.
+            terms = [k.strip().lower() for k in keywords if k.strip()]
+            conditions = ""
+            for i, term in enumerate(terms, start=5):
+                conditions += f" AND search @@ phraseto_tsquery('english', ${i})"
+                if re.search(r"[^\w\s]", term):
+                    conditions += f" AND strpos(lower(concat_ws(' ', title, description)), ${i}) > 0"
+            rows = await conn.fetch(f'''
+                SELECT job_id, country, title, employer, apply_link, city, state, is_remote, description,
+                       posted_at
+                FROM job_archive
+                WHERE country = $1 AND posted_at > $2{conditions}
+                  AND ($3 = '' OR lower(concat_ws(' ', city, state)) LIKE '%' || $3 || '%'
+                       OR ($3 = 'remote' AND is_remote))
+                ORDER BY posted_at DESC
+                LIMIT $4
+            ''', country, cutoff, location, ARCHIVE_SEARCH_LIMIT, *terms)
+        ARCHIVE_LOOKUPS_TOTAL.inc(result="stale")
+        self.refresh_in_background(key, days_limit)
+        # Someone is waiting, so a short answer beats paging the live API behind it
+        return [self._as_job(row) for row in rows], True
+
+    def refresh_in_background(self, key, days_limit):
+        query_key = self.query_key(key)
+        if query_key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, days_limit))
+        self._refreshing[query_key] = task
+        task.add_done_callback(lambda t: self._refreshing.pop(query_key, None))
+
+    async def _refresh(self, key, days_limit):
+        try:
+            jobs = []
+            async for batch in iter_recent_jobs(key, days_limit):
+                jobs += batch
+            self.mark_refreshed(key, jobs)
+            async with db_pool.acquire() as conn:
+                await self.flush(conn)
+        except Exception as e:
+            print(f"[ERROR] Background archive refresh failed for {key}: {e!r}")
+
+    async def maybe_purge(self):
+        """Drop jobs not seen in a fetch for ARCHIVE_RETENTION, and their old query stamps."""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        cutoff = datetime.now(UTC) - ARCHIVE_RETENTION
+        async with db_pool.acquire() as conn:
+            await conn.execute('DELETE FROM job_archive WHERE fetched_at < $1', cutoff)
+            await conn.execute('DELETE FROM archive_queries WHERE refreshed_at < $1', cutoff)
+        self._last_purge = time.monotonic()
+
+job_archive = JobArchive()
+
+# ---- Country Feed Matching ----
+def tokenize(text):
+    return re.findall(r"[a-z0-9+#]+", (text or "").lower())
+
+class JobFeedIndex:
+    """Inverted index (token -> job positions) over one country's broad feed.
+
+    Built once per feed refresh; match() then answers a subscriber's keywords with a few set
+    intersections instead of a JSearch query per user. Keywords are ANDed like the terms of
+    a per-user query, and multi-word keywords must appear as a phrase.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._texts = []  # normalized " token token ... " per job, for phrase checks
+        self._places = []
+        self._postings = {}
+        for position, job in enumerate(jobs):
+            tokens = tokenize(" ".join(filter(None, (
+                job.get("job_title"), job.get("employer_name"), job.get("job_description")))))
+            place = tokenize(" ".join(filter(None, (
+                job.get("job_city"), job.get("job_state"), job.get("job_country")))))
+            self._texts.append(f" {' '.join(tokens)} ")
+            self._places.append(f" {' '.join(place)} ")
+            for token in set(tokens):
+                self._postings.setdefault(token, []).append(position)
+
+    def _phrase_hits(self, phrase_tokens):
+        postings = [self._postings.get(token) for token in phrase_tokens]
+        if not all(postings):
+            return set()
+        hits = set(min(postings, key=len)).intersection(*postings)
+        if len(phrase_tokens) > 1:
+            phrase = f" {' '.join(phrase_tokens)} "
+            hits = {position for position in hits if phrase in self._texts[position]}
+        return hits
+
+    def _at_location(self, position, location_tokens):
+        if location_tokens == ["remote"] and self.jobs[position].get("job_is_remote"):
+            return True
+        return f" {' '.join(location_tokens)} " in self._places[position]
+
+    def match(self, keywords, location):
+        """Jobs matching every keyword (and the location, if set), in feed order."""
+        hits = None
+        for keyword in keywords:
+            tokens = tokenize(keyword)
+            if not tokens:
+                continue
+            keyword_hits = self._phrase_hits(tokens)
+            hits = keyword_hits if hits is None else hits & keyword_hits
+            if not hits:
+                return []
+        if hits is None:
+            return []
+        location_tokens = tokenize(location)
+        if location_tokens:
+            hits = {position for position in hits if self._at_location(position, location_tokens)}
+        return [self.jobs[position] for position in sorted(hits)]
+
+feed_cache = JobResultCache(FEED_TTL, len(COUNTRY_CHOICES) * 2)
+
+async def get_country_feed(country, days_limit):
+    """The indexed broad feed for country, fetched at most once per FEED_TTL. None on failure."""
+    key = ((FEED_QUERY,), "", country)
+
+    async def build():
+        # A fresh archived feed (say, from before a restart) saves refetching every page
+        archived = await job_archive.lookup(key, days_limit, max_age=timedelta(seconds=FEED_TTL))
+        if archived is not None:
+            return JobFeedIndex(archived[0])
+        jobs = []
+        try:
+            async for batch in iter_recent_jobs(key, days_limit, FEED_MAX_PAGES):
+                jobs += batch
+        except JobFetchError:
+            return None
+        job_archive.mark_refreshed(key, jobs)
+        print(f"[INFO] Refreshed job feed for {country}: {len(jobs)} jobs")
+        return JobFeedIndex(jobs)
+    return await feed_cache.get_or_fetch((country, days_limit), build)
+
+# ---- Helper: Send Job Results ----
+async def send_job_results(channel_id, user_id, keywords, location, country, days_limit=4, allow_stale=False):
+    """Find the user's new recent jobs and queue them in the outbox for channel_id.
+
+    Results come from the job archive when it's fresh enough (allow_stale: any archived results,
+    refreshed in the background), otherwise from JSearch, and every fetched job is archived.
+    Returns True if results were queued or there was nothing new, False if the search failed.
+    The message is written by the caller's next outbox.flush() and sent by outbox.drain().
+    """
+    try:
+        country = country or "us"
+        keyword_list = list(keywords or [])
+        days_limit = 4
+        recent_jobs = []
+        if JOB_FEED_MODE == "country":
+            feed = await get_country_feed(country, days_limit)
+            if feed is None:
+                return False
+            recent_jobs = await seen_jobs.filter_new(user_id, feed.match(keyword_list, location))
+        else:
+            key = job_query_key(keyword_list, location, country)
+            archived = None
+            # Pages still in the in-memory cache are cheaper than the archive
+            if job_page_key(key, days_limit, 1) not in job_cache:
+                archived = await job_archive.lookup(key, days_limit, allow_stale)
+            if archived is not None:
+                jobs, complete = archived
+                recent_jobs = await seen_jobs.filter_new(user_id, jobs)
+                if len(recent_jobs) < 20 and not complete:
+                    # Whoever fetched these stopped paging early; there may be more further on
+                    archived, recent_jobs = None, []
+            if archived is None:
+                fetched = []
+                complete = False
                 try:
-                    await channel.send(msg)
-                except discord.Forbidden:
-                    print(f"[ERROR] Cannot send message in channel {channel.id} for user {user_id} (forbidden)")
-                    return False
-                except Exception as e:
-                    print(f"[ERROR] Failed to send message in channel {channel.id} for user {user_id}: {e}")
+                    async for batch in iter_recent_jobs(key, days_limit):
+                        fetched += batch
+                        # Drop anything this user was already sent; stop paging once we have 20 new ones
+                        recent_jobs += await seen_jobs.filter_new(user_id, batch)
+                        if len(recent_jobs) >= 20:
+                            break
+                    else:
+                        complete = True
+                except JobFetchError:
                     return False
+                # Even if we stopped early, these are the newest results for this query
+                job_archive.mark_refreshed(key, fetched, complete)
+        recent_jobs = recent_jobs[:20]
+        if not recent_jobs:
+            print(f"[INFO] No new recent jobs found for user {user_id}")
+            return True
+        msg = f"<@{user_id}> Top Recent Job Results:\n"
+        for job in recent_jobs:
+            # Use plain links in < > to suppress Discord embeds
+            msg += f"• {job['job_title']} at {job['employer_name']}: <{job['job_apply_link']}>\n"
+        outbox.add(user_id, channel_id, msg, recent_jobs)
+        seen_jobs.mark_seen(user_id, recent_jobs)
         return True
     except Exception as e:
         print(f"[ERROR] Unexpected error in send_job_results for user {user_id}: {e}")
@@ -398,9 +1991,7 @@ async def send_job_results(guild, user_id, keywords, location, days_limit=4):
 @user_limit_check
 async def searchnow(interaction: discord.Interaction):
     uid = interaction.user.id
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT keywords, location, channel_id, updates_enabled, subscribed FROM user_settings WHERE user_id=$1', uid)
-        user_count = await conn.fetchval('SELECT COUNT(*) FROM user_settings WHERE subscribed=TRUE')
+    row = user_registry.get(uid)
     if not row or not row["keywords"] or not row.get("subscribed", True):
         await interaction.response.send_message(
             "You haven't set any keywords yet. Use /setkeywords first.\n\n"
@@ -417,28 +2008,48 @@ async def searchnow(interaction: discord.Interaction):
             "Only jobs posted within the last 4 days will be sent.",
             ephemeral=True)
         return
-    # Enforce strict 18-user limit for enabling updates (resubscription)
-    if not row["subscribed"] and user_count >= 18:
+    # Enforce the subscriber limit for enabling updates (resubscription)
+    if not row["subscribed"] and user_registry.is_full():
         await interaction.response.send_message(
-            "❌ Sorry, the bot has reached the maximum number of users (18). Please try again later or ask someone to unsubscribe.", ephemeral=True)
+            f"❌ Sorry, the bot has reached the maximum number of users ({MAX_SUBSCRIBERS}). Please try again later or ask someone to unsubscribe.", ephemeral=True)
         return
     await interaction.response.defer(ephemeral=True)
-    # Find the channel in any guild
-    channel = None
-    for g in client.guilds:
-        ch = g.get_channel(row["channel_id"])
-        if ch:
-            channel = ch
-            break
+    channel = client.resolve_channel(row["channel_id"])
     if not channel:
         await interaction.followup.send("Sorry, I couldn't find your selected channel in any server.", ephemeral=True)
         return
-    success = await send_job_results(channel.guild, uid, row["keywords"], row["location"], 4)
+    success = False
+    if channel.permissions_for(channel.guild.me).send_messages:
+        await seen_jobs.refresh_users([uid])
+        # Someone is waiting: answer from the archive even if it's stale, and refresh it behind them
+        success = await send_job_results(channel.id, uid, row["keywords"], row["location"], row["country"], 4,
+                                         allow_stale=True)
     if success:
         # Enable periodic updates for this user and set last_sent to now, and resubscribe if needed
         now = datetime.now(UTC)
         async with db_pool.acquire() as conn:
-            await conn.execute('UPDATE user_settings SET updates_enabled=TRUE, last_sent=$1, subscribed=TRUE WHERE user_id=$2', now.isoformat(), uid)
+            async with conn.transaction():
+                await conn.execute('UPDATE user_settings SET updates_enabled=TRUE, last_sent=$1, next_due=$2, subscribed=TRUE WHERE user_id=$3',
+                                   now, now + DELIVERY_INTERVAL, uid)
+                await seen_jobs.flush(conn, [uid])
+                await job_archive.flush(conn)
+                queued = [entry["id"] for entry in await outbox.flush(conn) if entry["user_id"] == uid]
+        user_registry.update(uid, updates_enabled=True, subscribed=True)
+        # Send right away rather than waiting for the scheduler; a failure stays queued for retry.
+        # A worker may still have claimed it first, in which case it's being posted, not failed.
+        owner = delivery_owner()
+        sent = await outbox.drain(owner, resolve_delivery_channel, ids=queued, linger=False) if queued else []
+        if len(sent) < len(queued):
+            sent += await outbox.in_flight([i for i in queued if i not in sent], owner)
+        # Only now, so a woken scheduler can't claim the message out from under this drain
+        await wake_scheduler()
+        if len(sent) < len(queued):
+            await interaction.followup.send(
+                "Your job results are queued but couldn't be posted yet; I'll keep retrying. "
+                "Please check my permissions in the selected channel.\n"
+                "You will receive job results there every 4 days (from now).",
+                ephemeral=True)
+            return
         await interaction.followup.send(
             "Done! You will now receive job results in your selected channel every 4 days (from now).\n"
             "Only jobs posted within the last 4 days will be sent.",
@@ -461,6 +2072,7 @@ async def setchannel(interaction: discord.Interaction, channel: discord.TextChan
             VALUES ($1, $2)
             ON CONFLICT (user_id) DO UPDATE SET channel_id = $2
         ''', uid, channel.id)
+    user_registry.update(uid, channel_id=channel.id)
     await interaction.response.send_message(f"✅ Channel set! You'll receive job results in {channel.mention}.", ephemeral=True)
 
 # ---- Slash Command: clearchannel ----
@@ -470,6 +2082,8 @@ async def clearchannel(interaction: discord.Interaction):
     uid = interaction.user.id
     async with db_pool.acquire() as conn:
         await conn.execute('UPDATE user_settings SET channel_id=NULL WHERE user_id=$1', uid)
+    if user_registry.get(uid):
+        user_registry.update(uid, channel_id=None)
     await interaction.response.send_message("Your job results channel has been cleared.", ephemeral=True)
 
 # ---- Slash Command: showchannel ----
@@ -477,21 +2091,16 @@ async def clearchannel(interaction: discord.Interaction):
 @user_limit_check
 async def showchannel(interaction: discord.Interaction):
     uid = interaction.user.id
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT channel_id FROM user_settings WHERE user_id=$1', uid)
+    row = user_registry.get(uid)
     if not row or not row["channel_id"]:
         await interaction.response.send_message("You haven't set a channel yet. Use /setchannel to pick one.", ephemeral=True)
         return
-    channel = None
-    for g in client.guilds:
-        ch = g.get_channel(row["channel_id"])
-        if ch:
-            channel = ch
-            break
+    channel = client.resolve_channel(row["channel_id"])
     if not channel:
         await interaction.response.send_message("The previously set channel no longer exists. Please set a new one with /setchannel.", ephemeral=True)
         return
     await interaction.response.send_message(f"Your job results will be sent to: {channel.mention}", ephemeral=True)
 
 # ---- Run Bot ----
-client.run(os.environ.get("DISCORD_TOKEN"))
+if __name__ == "__main__":
+    client.run(os.environ.get("DISCORD_TOKEN"))
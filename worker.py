@@ -0,0 +1,45 @@
+# ---- Delivery Worker ----
+# Runs the delivery scheduler in its own process, talking to Discord over REST only.
+# Run the bot with DELIVERY_MODE=workers and start as many of these as you need:
+#
+#   python worker.py
+#
+# Workers claim due users from Postgres with expiring leases (see claim_due_users in bot.py),
+# so they never deliver to the same user twice, and a crashed worker's users are picked up
+# by the others once its leases expire.
+import os
+import asyncio
+import discord
+
+import bot
+
+
+async def main():
+    rest = discord.Client(intents=discord.Intents.none())
+    # login() only sets up the REST client; no gateway connection is opened
+    await rest.login(os.environ.get("DISCORD_TOKEN"))
+    bot.open_api_session()
+    # Separate port so a worker can run next to the gateway process; 0 disables it
+    bot.METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", 0))
+    metrics_runner, _ = await asyncio.gather(bot.start_metrics_server(), bot.init_db())
+    listener = await bot.listen_for_schedule_changes()
+
+    def resolve_channel(user_id, channel_id):
+        # No guild cache here; a deleted channel or missing permission shows up as a failed send
+        return rest.get_partial_messageable(channel_id) if channel_id else None
+
+    owner = bot.delivery_owner()
+    print(f"[INFO] Delivery worker {owner} started")
+    try:
+        await bot.supervise_scheduler(owner, resolve_channel)
+    finally:
+        await listener.close()
+        await bot.close_api_session()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.db_pool.close()
+        await rest.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())